@@ -0,0 +1,46 @@
+import time
+from pathlib import Path
+
+import torch
+
+from generation.exported_chord_lstm import ExportedChordLstm
+
+
+@torch.inference_mode()
+def benchmark_exported_chord_lstm(export_folder: Path, test_sequences: list, batch_sizes: tuple = (1, 64),
+                                  num_steps: int = 200) -> dict:
+    # latency of a generation step and next chord accuracy and loss on the test sequences,
+    # for the fp32 and the int8 artifact of the export folder
+    results = dict()
+    for quantized in (False, True):
+        model = ExportedChordLstm(export_folder, quantized)
+        result = {f'ms_per_step_batch_{batch_size}': _get_step_latency(model, batch_size, num_steps)
+                  for batch_size in batch_sizes}
+        result.update(_get_accuracy(model, test_sequences))
+        results['int8' if quantized else 'fp32'] = result
+    return results
+
+
+def _get_step_latency(model: ExportedChordLstm, batch_size: int, num_steps: int) -> float:
+    chords = torch.zeros(batch_size, dtype=torch.int64)
+    hidden = model.get_initial_hidden(batch_size)
+    for _ in range(10):
+        model.forward_step(chords, hidden)
+    start = time.perf_counter()
+    for _ in range(num_steps):
+        _, hidden = model.forward_step(chords, hidden)
+    return (time.perf_counter() - start) / num_steps * 1000
+
+
+def _get_accuracy(model: ExportedChordLstm, test_sequences: list) -> dict:
+    num_correct = 0
+    num_chords = 0
+    loss = 0.0
+    for chord_input, chord_target in test_sequences:
+        hidden = None
+        for chord, target in zip(chord_input, chord_target):
+            scores, hidden = model.forward_step(torch.tensor([int(chord)]), hidden)
+            num_correct += int(scores.argmax().item() == target)
+            loss -= scores[0, int(target)].item()
+            num_chords += 1
+    return {'accuracy': num_correct / num_chords, 'loss': loss / num_chords}
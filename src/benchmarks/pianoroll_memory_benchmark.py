@@ -0,0 +1,137 @@
+import hashlib
+import logging
+import multiprocessing
+from pathlib import Path
+
+import numpy as np
+import pretty_midi as pm
+
+import settings
+from utils import corpus, midi_functions
+
+# Peak resident memory of the pianoroll path of single songs: the pianoroll, its packed notes and its histogram per
+# bar. Every song runs in a fresh process, once with the bool pianoroll of utils.midi_functions and once with the
+# baseline path on the float64 pianorolls of pretty_midi that it replaced, so both can be compared per song.
+PIANOROLL_PATHS = ('baseline', 'compact')
+
+
+def benchmark_pianoroll_memory(midi_files: list[Path]) -> list[dict]:
+    results = []
+    for midi_file in midi_files:
+        runs = {pianoroll_path: _run_in_process(midi_file, pianoroll_path) for pianoroll_path in PIANOROLL_PATHS}
+        result = {
+            'song': midi_file.name,
+            'instruments': runs['compact']['instruments'],
+            'steps': runs['compact']['steps'],
+            # both paths have to produce the same packed notes and histograms
+            'identical': runs['baseline']['outputs_hash'] == runs['compact']['outputs_hash'],
+        }
+        for pianoroll_path, run in runs.items():
+            result[pianoroll_path] = {name: run[name] for name in ('peak_rss_megabytes', 'pianoroll_megabytes')}
+        logging.info(f'{midi_file.name}: {result["instruments"]} instruments, {result["steps"]} steps, pianoroll '
+                     f'peak {result["baseline"]["pianoroll_megabytes"]:.1f} MB baseline, '
+                     f'{result["compact"]["pianoroll_megabytes"]:.1f} MB compact')
+        results.append(result)
+    return results
+
+
+def _run_in_process(midi_file: Path, pianoroll_path: str) -> dict:
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=_run_pianoroll_path, args=(midi_file, pianoroll_path, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def _run_pianoroll_path(midi_file: Path, pianoroll_path: str, queue) -> None:
+    midi = pm.PrettyMIDI(str(midi_file))
+    # parsing the midi file has a higher peak than most pianorolls, so the peak is reset after it and only the
+    # memory the pianoroll path needs on top of the parsed song is counted
+    _reset_peak_rss()
+    parsed_rss = _get_rss_kilobytes('VmRSS')
+    if pianoroll_path == 'baseline':
+        note_index, histogram = _get_baseline_outputs(midi)
+        peak_rss = _get_rss_kilobytes('VmHWM')
+        # packed after the peak is read, only to compare the outputs
+        packed_notes = corpus.note_index_to_array(note_index)
+    else:
+        pianoroll = midi_functions.get_pianoroll_of_pretty_midi(midi, settings.sampling_frequency)
+        packed_notes = midi_functions.pianoroll_to_packed_notes(pianoroll)
+        histogram = midi_functions.pianoroll_to_histo_oct(pianoroll, settings.samples_per_bar,
+                                                          settings.half_steps_in_octave)
+        peak_rss = _get_rss_kilobytes('VmHWM')
+    queue.put({
+        'instruments': len(midi.instruments),
+        'steps': len(packed_notes),
+        'peak_rss_megabytes': peak_rss / 1024,
+        'pianoroll_megabytes': (peak_rss - parsed_rss) / 1024,
+        'outputs_hash': hashlib.sha1(packed_notes.tobytes() + histogram.tobytes()).hexdigest(),
+    })
+
+
+def _get_baseline_outputs(midi: pm.PrettyMIDI) -> tuple[list[tuple], np.ndarray]:
+    # the pianoroll path before the bool pianorolls, with the note index it stored instead of the packed notes
+    if settings.over_sample_midi_files:
+        pianoroll = _baseline_over_sample(midi)
+    else:
+        pianoroll = midi.get_piano_roll(fs=settings.sampling_frequency)
+    for i, _ in enumerate(pianoroll):
+        for j, _ in enumerate(pianoroll[i]):
+            if pianoroll[i, j] != 0:
+                pianoroll[i, j] = 1
+    note_index = _baseline_pianoroll_to_note_index(pianoroll)
+    histogram_per_bar = _baseline_pianoroll_to_histogram_per_bar(pianoroll, settings.samples_per_bar)
+    return note_index, _baseline_squash_octaves(histogram_per_bar, settings.half_steps_in_octave)
+
+
+# The functions of utils.midi_functions the baseline path was built of, kept verbatim so the benchmark keeps
+# measuring them.
+
+def _baseline_over_sample(midi_file: pm.PrettyMIDI) -> np.ndarray:
+    pianoroll_double_sampled = midi_file.get_piano_roll(fs=settings.sampling_frequency * settings.over_sample_factor)
+    pianoroll = []
+    for i in range(0, pianoroll_double_sampled.shape[1], settings.over_sample_factor):
+        vec = np.sum(pianoroll_double_sampled[:, i:(i + settings.over_sample_factor)], axis=1)
+        pianoroll.append(vec)
+    pianoroll = np.array(pianoroll)
+    pianoroll = np.transpose(pianoroll)
+    return pianoroll
+
+
+def _baseline_pianoroll_to_note_index(pianoroll: np.ndarray) -> list[tuple]:
+    note_index = []
+    for i in range(0, pianoroll.shape[1]):
+        step = []
+        for j, note in enumerate(pianoroll[:, i]):
+            if note != 0:
+                step.append(j)
+        note_index.append(tuple(step))
+    return note_index
+
+
+def _baseline_pianoroll_to_histogram_per_bar(pianoroll: np.ndarray, samples_per_bar: int) -> np.ndarray:
+    histogram_per_bar = np.zeros((pianoroll.shape[0], int(pianoroll.shape[1] / samples_per_bar)))
+    for i in range(0, pianoroll.shape[1] - samples_per_bar + 1, samples_per_bar):
+        histogram_per_bar[:, int(i / samples_per_bar)] = np.sum(pianoroll[:, i:i + samples_per_bar], axis=1)
+    return histogram_per_bar
+
+
+def _baseline_squash_octaves(histogram_per_bar: np.ndarray, semitones_in_octave: int) -> np.ndarray:
+    squashed_histogram = np.zeros((semitones_in_octave, histogram_per_bar.shape[1]))
+    for i in range(0, histogram_per_bar.shape[0] - semitones_in_octave + 1, semitones_in_octave):
+        squashed_histogram = np.add(squashed_histogram, histogram_per_bar[i:i + semitones_in_octave])
+    return squashed_histogram
+
+
+def _reset_peak_rss() -> None:
+    # linux only, resets the peak resident memory (VmHWM) of the process to its current resident memory
+    Path('/proc/self/clear_refs').write_text('5')
+
+
+def _get_rss_kilobytes(name: str) -> int:
+    for line in Path('/proc/self/status').read_text().splitlines():
+        if line.startswith(name + ':'):
+            return int(line.split()[1])
+    raise ValueError(f'{name} is not in /proc/self/status')
@@ -0,0 +1,56 @@
+import time
+import resource
+import multiprocessing
+from pathlib import Path
+
+from preprocessing import stage_graph
+from preprocessing.midi_data_preprocessor_config import MidiDataPreprocessorConfig
+from preprocessing.midi_data_processor import MidiDataPreprocessor
+
+
+def benchmark_preprocessing(config: MidiDataPreprocessorConfig, fused: bool = False) -> list[dict]:
+    # runs every stage in a fresh process, so the peak resident memory is the one of the stage and its workers
+    results = []
+    for stage in stage_graph.get_pipeline(fused):
+        # the main input folder of the stage
+        input_files = [file for file in getattr(config, stage.inputs[0]).rglob('*') if file.is_file()]
+        input_megabytes = sum(file.stat().st_size for file in input_files) / 2 ** 20
+        result = _run_in_process(config, stage)
+        result.update({
+            'stage': stage.name,
+            'files': len(input_files),
+            'files_per_second': len(input_files) / result['seconds'],
+            'megabytes_per_second': input_megabytes / result['seconds'],
+        })
+        results.append(result)
+    return results
+
+
+def _run_in_process(config: MidiDataPreprocessorConfig, stage: stage_graph.Stage) -> dict:
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=_run_stage, args=(config, stage, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def _run_stage(config: MidiDataPreprocessorConfig, stage: stage_graph.Stage, queue) -> None:
+    midi_preprocessor = MidiDataPreprocessor(config)
+    start = time.perf_counter()
+    getattr(midi_preprocessor, stage.name)(*stage_graph.get_stage_arguments(stage))
+    seconds = time.perf_counter() - start
+    # ru_maxrss is in kilobytes on linux
+    peak_rss = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                   resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    queue.put({'seconds': seconds, 'peak_rss_megabytes': peak_rss / 1024})
+
+
+def get_benchmark_config(data_folder: Path, num_workers: int) -> MidiDataPreprocessorConfig:
+    # the folders of run_preprocessing without manifests, so every run processes every file
+    from run_preprocessing import get_midi_preprocessor_config
+    config = get_midi_preprocessor_config(data_folder)
+    config.num_workers = num_workers
+    config.manifest_folder = None
+    return config
@@ -0,0 +1,80 @@
+from pathlib import Path
+
+import mido
+import numpy as np
+
+MAJOR_SCALE = (0, 2, 4, 5, 7, 9, 11)
+TICKS_PER_BEAT = 480
+BEATS_PER_BAR = 4
+
+
+class SyntheticCorpusConfig:
+    def __init__(self, num_songs: int = 100, bars_per_song: int = 64, polyphony: int = 4,
+                 tempo_changes_per_song: int = 4, num_instruments: int = 2, seed: int = 0):
+        self.num_songs = num_songs
+        self.bars_per_song = bars_per_song
+        # notes played at the same time per instrument, the first three form a triad of the key, the others melody
+        self.polyphony = polyphony
+        self.tempo_changes_per_song = tempo_changes_per_song
+        self.num_instruments = num_instruments
+        # the same seed always generates the same corpus
+        self.seed = seed
+
+
+def generate_synthetic_corpus(corpus_folder: Path, config: SyntheticCorpusConfig) -> list[Path]:
+    # writes num_songs midi files in random major keys, so they pass the key detection of the preprocessing
+    corpus_folder.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(config.seed)
+    midi_files = []
+    for song_index in range(config.num_songs):
+        midi_file = corpus_folder.joinpath(f'synthetic_{song_index:05d}.mid')
+        generate_synthetic_song(rng, config).save(midi_file)
+        midi_files.append(midi_file)
+    return midi_files
+
+
+def generate_synthetic_song(rng: np.random.Generator, config: SyntheticCorpusConfig) -> mido.MidiFile:
+    midi = mido.MidiFile(type=1, ticks_per_beat=TICKS_PER_BEAT)
+    song_ticks = config.bars_per_song * BEATS_PER_BAR * TICKS_PER_BEAT
+    tempo_ticks = [0] + np.sort(rng.integers(1, song_ticks, config.tempo_changes_per_song)).tolist()
+    tempo_events = [(tick, mido.MetaMessage('set_tempo', tempo=mido.bpm2tempo(int(rng.integers(70, 180)))))
+                    for tick in tempo_ticks]
+    midi.tracks.append(_to_track(tempo_events, song_ticks))
+
+    key = int(rng.integers(0, 12))
+    scale = np.array(MAJOR_SCALE) + key
+    for channel in range(config.num_instruments):
+        midi.tracks.append(_to_track(_generate_notes(rng, config, scale, channel), song_ticks))
+    return midi
+
+
+def _generate_notes(rng: np.random.Generator, config: SyntheticCorpusConfig, scale: np.ndarray,
+                    channel: int) -> list[tuple]:
+    events = []
+    octave = 12 * (4 + channel % 3)
+    for bar in range(config.bars_per_song):
+        root = int(rng.integers(0, len(MAJOR_SCALE)))
+        triad = [scale[(root + step) % len(MAJOR_SCALE)] for step in (0, 2, 4)]
+        bar_start = bar * BEATS_PER_BAR * TICKS_PER_BEAT
+        for beat in range(BEATS_PER_BAR):
+            start = bar_start + beat * TICKS_PER_BEAT
+            melody = rng.choice(scale, max(0, config.polyphony - len(triad)))
+            for pitch in triad[:config.polyphony] + [note + 12 for note in melody]:
+                length = int(rng.choice([TICKS_PER_BEAT // 2, TICKS_PER_BEAT]))
+                velocity = int(rng.integers(40, 120))
+                events.append((start, mido.Message('note_on', channel=channel, note=int(pitch + octave),
+                                                   velocity=velocity)))
+                events.append((start + length, mido.Message('note_off', channel=channel, note=int(pitch + octave),
+                                                            velocity=0)))
+    return events
+
+
+def _to_track(events: list[tuple], song_ticks: int) -> mido.MidiTrack:
+    # absolute ticks to the delta times of a track, note offs before note ons at the same tick
+    track = mido.MidiTrack()
+    last_tick = 0
+    for tick, message in sorted(events, key=lambda event: (event[0], event[1].type != 'note_off')):
+        track.append(message.copy(time=tick - last_tick))
+        last_tick = tick
+    track.append(mido.MetaMessage('end_of_track', time=max(0, song_ticks - last_tick)))
+    return track
@@ -0,0 +1,45 @@
+import time
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+import torch
+
+from training.chord_lstm.chord_lstm import ChordLstm
+from training.chord_lstm.data_loader import ChordDataLoader
+from training.lstm_trainer import LstmTrainer, LstmTrainerConfig
+
+
+def benchmark_training(chords_index_folder: Path, batch_size: int, num_epochs: int,
+                       window_length: Optional[int] = None, seed: int = 0) -> dict:
+    # throughput of LstmTrainer.train, the time includes the evaluation of the test set after every epoch
+    torch.manual_seed(seed)
+    training_data, test_data = ChordDataLoader(chords_index_folder).get_chord_train_and_test_set()
+    model = ChordLstm()
+    with tempfile.TemporaryDirectory() as model_folder:
+        trainer_config = LstmTrainerConfig(
+            loss_fn=torch.nn.NLLLoss(),
+            optimizer=torch.optim.Adam(model.parameters(), lr=1e-2),
+            num_epochs=num_epochs,
+            model_folder=Path(model_folder),
+            batch_size=batch_size,
+            window_length=window_length,
+            seed=seed,
+        )
+        trainer = LstmTrainer(model, training_data, test_data, trainer_config)
+        num_steps = sum(1 for _ in trainer.training_loader) * num_epochs
+        num_chords = sum(len(chord_input) for chord_input, _ in training_data) * num_epochs
+        start = time.perf_counter()
+        trainer.train()
+        seconds = time.perf_counter() - start
+    return {
+        'batch_size': batch_size,
+        'window_length': window_length,
+        'epochs': num_epochs,
+        'seconds': seconds,
+        'songs_per_second': len(training_data) * num_epochs / seconds,
+        'chords_per_second': num_chords / seconds,
+        'ms_per_step': seconds / num_steps * 1000,
+        'training_loss': trainer.training_loss,
+        'test_loss': trainer.test_loss,
+    }
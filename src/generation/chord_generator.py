@@ -0,0 +1,89 @@
+from pathlib import Path
+from typing import Optional
+
+import torch
+import _pickle as pickle
+
+import settings
+
+
+def load_index_dict(index_dict_path: Path) -> dict:
+    # the index to chord dictionary written by MidiDataPreprocessor.make_chord_dict
+    return pickle.load(open(index_dict_path, 'rb'))
+
+
+class ChordGenerator:
+    # Generates chord progressions with a trained chord LSTM. The prefix is run through the model once, after that
+    # the hidden state is kept and every generated chord costs a single batched step for all progressions.
+    def __init__(self, model: torch.nn.Module, index_to_chord: dict):
+        self.model = model.eval()
+        self.index_to_chord = index_to_chord
+        self.chord_to_index = {chord: index for index, chord in index_to_chord.items()}
+        self.unknown_chord_index = self.chord_to_index[settings.unknown_chord_tag]
+        self.unknown_masks = dict()
+
+    @classmethod
+    def from_index_dict_file(cls, model: torch.nn.Module, index_dict_path: Path):
+        return cls(model, load_index_dict(index_dict_path))
+
+    @torch.inference_mode()
+    def sample(self, prefix: list[tuple], num_chords: int, num_progressions: int = 1, temperature: float = 1.0,
+               top_k: Optional[int] = None, allow_unknown: bool = False,
+               generator: Optional[torch.Generator] = None) -> list[list[tuple]]:
+        # samples num_progressions continuations of num_chords chords of the prefix in one batch,
+        # a temperature below 1 sharpens the distribution, top_k only samples from the k most likely chords
+        if temperature <= 0:
+            raise ValueError(f'The temperature has to be positive, not {temperature}')
+        if top_k is not None and top_k < 1:
+            raise ValueError(f'top_k has to be at least 1, not {top_k}')
+        scores, hidden = self.__run_prefix(prefix)
+        scores, hidden = scores.expand(num_progressions, -1), tuple(state.repeat(1, num_progressions, 1)
+                                                                    for state in hidden)
+        progressions = torch.empty((num_progressions, num_chords), dtype=torch.int64)
+        for step in range(num_chords):
+            logits = self.__mask_unknown(scores, allow_unknown) / temperature
+            if top_k is not None:
+                # a top_k above the vocabulary samples from all chords
+                kth_best = torch.topk(logits, min(top_k, logits.shape[1]), dim=1).values[:, -1:]
+                logits = logits.masked_fill(logits < kth_best, float('-inf'))
+            chords = torch.multinomial(torch.softmax(logits, dim=1), 1, generator=generator).squeeze(1)
+            progressions[:, step] = chords
+            scores, hidden = self.model.forward_step(chords, hidden)
+        return [self.__to_chords(progression) for progression in progressions.tolist()]
+
+    @torch.inference_mode()
+    def beam_search(self, prefix: list[tuple], num_chords: int, beam_width: int = 5,
+                    allow_unknown: bool = False) -> list[tuple[list[tuple], float]]:
+        # the beam_width most likely continuations of num_chords chords with their log probabilities,
+        # all beams are advanced in one batched step
+        scores, hidden = self.__run_prefix(prefix)
+        beam_scores = torch.zeros(1)
+        beams = torch.empty((1, 0), dtype=torch.int64)
+        for _ in range(num_chords):
+            candidate_scores = beam_scores.unsqueeze(1) + self.__mask_unknown(scores, allow_unknown)
+            # masked chords are never part of a beam, also when there are fewer allowed candidates than beam_width
+            num_candidates = min(beam_width, int(torch.isfinite(candidate_scores).sum()))
+            beam_scores, candidates = torch.topk(candidate_scores.view(-1), num_candidates)
+            origins, chords = candidates // scores.shape[1], candidates % scores.shape[1]
+            beams = torch.cat([beams[origins], chords.unsqueeze(1)], dim=1)
+            scores, hidden = self.model.forward_step(chords, tuple(state[:, origins] for state in hidden))
+        return [(self.__to_chords(beam), score) for beam, score in zip(beams.tolist(), beam_scores.tolist())]
+
+    def __run_prefix(self, prefix: list[tuple]) -> tuple[torch.Tensor, tuple]:
+        if len(prefix) == 0:
+            raise ValueError('The prefix needs at least one chord')
+        indices = torch.tensor([self.chord_to_index.get(chord, self.unknown_chord_index) for chord in prefix])
+        # the whole prefix in one call, only the hidden state after its last chord is kept
+        return self.model.forward_prefix(indices)
+
+    def __mask_unknown(self, scores: torch.Tensor, allow_unknown: bool) -> torch.Tensor:
+        # indices without a chord in the dictionary (a vocabulary smaller than the model's) are never generated
+        mask_key = (scores.shape[1], allow_unknown)
+        if mask_key not in self.unknown_masks:
+            is_unknown = torch.tensor([index not in self.index_to_chord for index in range(scores.shape[1])])
+            is_unknown[self.unknown_chord_index] = not allow_unknown
+            self.unknown_masks[mask_key] = is_unknown
+        return scores.masked_fill(self.unknown_masks[mask_key], float('-inf'))
+
+    def __to_chords(self, indices: list[int]) -> list[tuple]:
+        return [self.index_to_chord[index] for index in indices]
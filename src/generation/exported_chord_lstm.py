@@ -0,0 +1,48 @@
+import json
+from pathlib import Path
+
+import torch
+
+# Inference with an exported chord LSTM, only needs torch and does not import the training code.
+INDEX_DICT_FILE = 'index_dict.json'
+META_FILE = 'meta.json'
+
+
+def get_model_file_name(quantized: bool) -> str:
+    return 'chord_lstm_int8.pt' if quantized else 'chord_lstm.pt'
+
+
+def load_exported_index_dict(export_folder: Path) -> dict:
+    index_dict = json.load(open(export_folder.joinpath(INDEX_DICT_FILE), 'r'))
+    return {int(index): chord if isinstance(chord, str) else tuple(chord) for index, chord in index_dict.items()}
+
+
+class ExportedChordLstm(torch.nn.Module):
+    # Has the forward_step and forward_prefix of ChordLstm, so it can be used by the ChordGenerator.
+    def __init__(self, export_folder: Path, quantized: bool = False):
+        super().__init__()
+        self.step = torch.jit.load(str(export_folder.joinpath(get_model_file_name(quantized))))
+        meta = json.load(open(export_folder.joinpath(META_FILE), 'r'))
+        self.num_layers = meta['num_layers']
+        self.hidden_size = meta['hidden_size']
+
+    def forward_step(self, chords: torch.Tensor, hidden: tuple = None):
+        if hidden is None:
+            hidden = self.get_initial_hidden(len(chords))
+        scores, hidden_state, cell_state = self.step(chords, *hidden)
+        return scores, (hidden_state, cell_state)
+
+    def forward_prefix(self, chords: torch.Tensor, hidden: tuple = None):
+        if hidden is None:
+            hidden = self.get_initial_hidden(1)
+        # artifacts exported before forward_prefix run the prefix step by step
+        if not hasattr(self.step, 'forward_prefix'):
+            for chord in chords:
+                scores, hidden = self.forward_step(chord.view(1), hidden)
+            return scores, hidden
+        scores, hidden_state, cell_state = self.step.forward_prefix(chords, *hidden)
+        return scores, (hidden_state, cell_state)
+
+    def get_initial_hidden(self, batch_size: int) -> tuple:
+        shape = (self.num_layers, batch_size, self.hidden_size)
+        return torch.zeros(shape), torch.zeros(shape)
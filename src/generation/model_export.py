@@ -0,0 +1,53 @@
+import copy
+import json
+from pathlib import Path
+
+import torch
+import torch.nn as nn
+
+from generation.exported_chord_lstm import INDEX_DICT_FILE, META_FILE, get_model_file_name
+
+
+class _ChordLstmStep(nn.Module):
+    # the single step of ChordLstm.forward_step and the prefix of ChordLstm.forward_prefix with an explicit hidden
+    # state, so they can be scripted
+    def __init__(self, model: nn.Module):
+        super().__init__()
+        self.chord_embedding = model.chord_embedding
+        self.lstm = model.lstm
+        self.hidden_to_chord = model.hidden_to_chord
+
+    def forward(self, chords: torch.Tensor, hidden_state: torch.Tensor, cell_state: torch.Tensor):
+        embeddings = self.chord_embedding(chords).unsqueeze(0)
+        output, (hidden_state, cell_state) = self.lstm(embeddings, (hidden_state, cell_state))
+        chord_space = self.hidden_to_chord(output.squeeze(0))
+        return torch.log_softmax(chord_space, dim=1), hidden_state, cell_state
+
+    @torch.jit.export
+    def forward_prefix(self, chords: torch.Tensor, hidden_state: torch.Tensor, cell_state: torch.Tensor):
+        embeddings = self.chord_embedding(chords).unsqueeze(1)
+        output, (hidden_state, cell_state) = self.lstm(embeddings, (hidden_state, cell_state))
+        chord_space = self.hidden_to_chord(output[-1])
+        return torch.log_softmax(chord_space, dim=1), hidden_state, cell_state
+
+
+def quantize_chord_lstm(model: nn.Module) -> nn.Module:
+    # dynamic quantization stores the weights of the LSTM and the linear layer as int8,
+    # activations are quantized on the fly
+    return torch.ao.quantization.quantize_dynamic(copy.deepcopy(model).eval(), {nn.LSTM, nn.Linear},
+                                                  dtype=torch.qint8)
+
+
+def export_chord_lstm(model: nn.Module, index_to_chord: dict, export_folder: Path, quantized: bool = False) -> Path:
+    # writes a TorchScript artifact of the model together with its chord dictionary and the sizes of its hidden
+    # state, the artifact can be loaded with ExportedChordLstm without the training code
+    export_folder.mkdir(parents=True, exist_ok=True)
+    model = quantize_chord_lstm(model) if quantized else copy.deepcopy(model).eval()
+    model_file = export_folder.joinpath(get_model_file_name(quantized))
+    torch.jit.script(_ChordLstmStep(model)).save(str(model_file))
+    index_dict = {index: chord if isinstance(chord, str) else [int(note) for note in chord]
+                  for index, chord in index_to_chord.items()}
+    json.dump(index_dict, open(export_folder.joinpath(INDEX_DICT_FILE), 'w'))
+    meta = {'num_layers': model.lstm.num_layers, 'hidden_size': model.lstm.hidden_size}
+    json.dump(meta, open(export_folder.joinpath(META_FILE), 'w'))
+    return model_file
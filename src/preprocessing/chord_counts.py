@@ -0,0 +1,63 @@
+import json
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from utils import midi_functions
+
+# counts of the chords of every song in the chord dictionary folder
+CHORD_COUNTS_FILE = 'chord_counts.json'
+
+
+class ChordCounts:
+    # Chord counts of every song, keyed by the name of its chord file. The chord extraction adds the counts of the
+    # songs it processes, so the vocabulary is updated with the new and changed songs only and a dictionary for
+    # any number of chords is derived from the counts without reading the chord files.
+    # The counts of a song are [chord bitmask, count] pairs in the order of the first occurrence of the chords,
+    # which keeps the order of chords that are played equally often the same as counting all chord files in order.
+    def __init__(self, path: Optional[Path]):
+        self.path = path
+        self.song_counts = self.__load_song_counts()
+        # unchanged counts are not written again, so the chord dictionary folder only changes with the counts
+        self.changed = False
+
+    def set_song(self, song: str, song_counts: list) -> None:
+        self.song_counts[song] = [[int(bitmask), int(count)] for bitmask, count in song_counts]
+        self.changed = True
+
+    def keep_songs(self, songs: set[str]) -> None:
+        for song in set(self.song_counts).difference(songs):
+            del self.song_counts[song]
+            self.changed = True
+
+    def get_missing_songs(self, songs: set[str]) -> list[str]:
+        return sorted(songs.difference(self.song_counts))
+
+    def get_most_common(self, num_chords: int) -> list[tuple[int, int]]:
+        counts = np.zeros(1 << midi_functions.PITCH_CLASSES, dtype=np.int64)
+        not_occurred = len(counts)
+        first_occurrences = np.full(len(counts), not_occurred, dtype=np.int64)
+        num_occurred = 0
+        for song in sorted(self.song_counts):
+            song_counts = np.array(self.song_counts[song], dtype=np.int64).reshape(-1, 2)
+            bitmasks = song_counts[:, 0]
+            counts[bitmasks] += song_counts[:, 1]
+            # the chords of the song that did not occur in an earlier song, in the order they occur in this song
+            new_bitmasks = bitmasks[first_occurrences[bitmasks] == not_occurred]
+            first_occurrences[new_bitmasks] = num_occurred + np.arange(len(new_bitmasks))
+            num_occurred += len(new_bitmasks)
+        num_played = int((counts > 0).sum())
+        most_common = np.lexsort((first_occurrences, -counts))[:min(num_chords, num_played)]
+        return [(bitmask, int(counts[bitmask])) for bitmask in most_common.tolist()]
+
+    def save(self) -> None:
+        if self.path is not None and (self.changed or not self.path.exists()):
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            json.dump(self.song_counts, open(self.path, 'w'), sort_keys=True)
+            self.changed = False
+
+    def __load_song_counts(self) -> dict:
+        if self.path is None or not self.path.exists():
+            return dict()
+        return json.load(open(self.path, 'r'))
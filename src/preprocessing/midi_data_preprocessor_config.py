@@ -1,12 +1,19 @@
 from pathlib import Path
+from typing import Optional
 
 
 class MidiDataPreprocessorConfig:
     def __init__(self, source_folder: Path, tempo_shift_folder: Path, histogram_per_bar_folder: Path, key_shifted_folder: Path,
                  key_shifted_histogram_per_bar_folder: Path, piano_roll_folder: Path, histogram_per_song_folder: Path,
                  chords_folder: Path, chords_index_folder: Path, dict_path: Path, chord_dict_name: str,
-                 index_dict_name: str, sampling_frequency: int):
+                 index_dict_name: str, sampling_frequency: int, num_workers: int = 1, chunk_size: Optional[int] = None,
+                 manifest_folder: Optional[Path] = None, corpus_folder: Optional[Path] = None,
+                 report_folder: Optional[Path] = None, tensorboard_report: bool = False,
+                 profiled_stages: tuple = (), num_slowest_files: int = 10, note_events_folder: Optional[Path] = None):
         self.source_folder = source_folder
+        # folder of the note events every midi file of the source folder is parsed into once, the stages that
+        # depend on the pianoroll and histogram settings read the events instead of the midi files
+        self.note_events_folder = note_events_folder
         self.tempo_shift_folder = tempo_shift_folder
         self.histogram_per_bar_folder = histogram_per_bar_folder
         self.key_shifted_folder = key_shifted_folder
@@ -19,3 +26,20 @@ class MidiDataPreprocessorConfig:
         self.chord_dict_name = chord_dict_name
         self.index_dict_name = index_dict_name
         self.sampling_frequency = sampling_frequency
+        # number of worker processes per stage, 1 processes all files in the calling process
+        self.num_workers = num_workers
+        # files handed to a worker at once, None picks a chunk size based on the number of files and workers
+        self.chunk_size = chunk_size
+        # folder of the per stage manifests, files whose source and settings did not change since the
+        # previous run are skipped, None processes every file on every run
+        self.manifest_folder = manifest_folder
+        # folder of the memory mapped corpora that consolidate the per song pickle files
+        self.corpus_folder = corpus_folder
+        # folder of the performance report of the stages, None only logs a summary per stage
+        self.report_folder = report_folder
+        # also write the report as tensorboard scalars into report_folder/tensorboard
+        self.tensorboard_report = tensorboard_report
+        # names of the stage methods that are run under cProfile, the profiles are written to the report folder
+        self.profiled_stages = profiled_stages
+        # number of the slowest files listed per stage in the report
+        self.num_slowest_files = num_slowest_files
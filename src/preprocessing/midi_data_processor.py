@@ -1,150 +1,365 @@
-import os
+import time
 import logging
+import cProfile
+import functools
 import numpy as np
-from collections import Counter
+from pathlib import Path
+from typing import Callable, Iterable, Optional
+from concurrent.futures import ProcessPoolExecutor
 import _pickle as pickle
 
 from mido import KeySignatureError
 
 import settings
-from utils import midi_functions
+from utils import corpus, midi_functions, note_events
+from preprocessing import song_preprocessing
+from preprocessing.stage_manifest import StageManifest, get_content_hash, get_files_hash
+from preprocessing.stage_report import PreprocessingReport, get_profile_stats
+from preprocessing.chord_counts import CHORD_COUNTS_FILE, ChordCounts
 from preprocessing.midi_data_preprocessor_config import MidiDataPreprocessorConfig
 
 
+def _run_job(job: Callable, intercepted_errors: tuple, profile: bool, job_args: tuple) -> tuple:
+    # executed in the worker processes, the result of the job and errors are sent back to the parent instead of
+    # being logged by the worker, together with the wall and cpu time of the job and its profile if the stage
+    # is profiled
+    profiler = cProfile.Profile() if profile else None
+    result, error_type, error = None, None, None
+    start_seconds, start_cpu_seconds = time.perf_counter(), time.process_time()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        result = job(*job_args)
+    except intercepted_errors as e:
+        error_type, error = type(e).__name__, str(e)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+    return result, error_type, error, time.perf_counter() - start_seconds,\
+        time.process_time() - start_cpu_seconds, get_profile_stats(profiler)
+
+
+def _reported_stage(stage_method: Callable) -> Callable:
+    # measures a stage in the report of the preprocessor and profiles it if it is one of the profiled stages
+    @functools.wraps(stage_method)
+    def run_reported_stage(self, *args, **kwargs):
+        stage = stage_method.__name__
+        self.stage_report = self.report.start_stage(stage)
+        profiler = cProfile.Profile() if stage in self.config.profiled_stages else None
+        if profiler is not None:
+            profiler.enable()
+        try:
+            return stage_method(self, *args, **kwargs)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                profile_file = self.report.save_profile(stage, profiler, self.stage_report.worker_profiles)
+                logging.info(f'Profile of {stage} written to {profile_file}')
+            self.report.finish_stage(self.stage_report)
+            self.stage_report = None
+    return run_reported_stage
+
+
 class MidiDataPreprocessor:
     def __init__(self, config: MidiDataPreprocessorConfig):
         self.config = config
         self.intercepted_errors =\
             (ValueError, EOFError, IndexError, OSError, KeyError, ZeroDivisionError, AttributeError, KeySignatureError)
+        # settings read by the midi functions of the stages, outputs are recomputed when one of them changes
+        self.tempo_settings = ('midi_bpm',)
+        self.pianoroll_settings = ('sampling_frequency', 'over_sample_midi_files', 'over_sample_factor')
+        self.histogram_settings = self.pianoroll_settings + ('samples_per_bar', 'half_steps_in_octave',
+                                                           'event_based_histograms')
+        # chord files hold a pitch class bitmask per bar, chord files in another format are recomputed
+        self.chord_format = {'chord_format': 'pitch_class_bitmask'}
+        # pianoroll files hold 128 packed bits per time step, pianoroll files in another format are recomputed
+        self.note_format = {'note_format': 'packed_bits'}
+        self.report = PreprocessingReport(config.report_folder, config.tensorboard_report, config.num_slowest_files)
+        self.stage_report = None
+
+    @_reported_stage
+    def save_note_events(self) -> None:
+        # the only stage besides the tempo shift that parses the source midi files, it reads no settings, so the
+        # events are only parsed again for new or changed midi files
+        self.config.note_events_folder.mkdir(exist_ok=True)
+        job = functools.partial(note_events.save_note_events, note_events_folder=self.config.note_events_folder)
+        self.__run_jobs('save_note_events', job,
+                        {midi_file: (midi_file,) for midi_file in self.config.source_folder.rglob('*.mid')},
+                        lambda midi_file: [
+                            self.config.note_events_folder.joinpath(midi_file.name + note_events.NOTE_EVENTS_SUFFIX)],
+                        ())
+
+    @_reported_stage
     def save_tempo_shifted_midi_files(self) -> None:
         self.config.tempo_shift_folder.mkdir(exist_ok=True)
-        for midi_file in self.config.source_folder.rglob('*.mid'):
-            try:
-                midi_functions.change_tempo_of_midi_file(midi_file, self.config.tempo_shift_folder)
-            except self.intercepted_errors as e:
-                logging.debug(f'Unexpected error when processing {midi_file}: {e}')
+        job = functools.partial(midi_functions.change_tempo_of_midi_file, target_path=self.config.tempo_shift_folder)
+        self.__run_jobs('save_tempo_shifted_midi_files', job,
+                        {midi_file: (midi_file,) for midi_file in self.config.source_folder.rglob('*.mid')},
+                        lambda midi_file: [self.config.tempo_shift_folder.joinpath(midi_file.name)],
+                        self.tempo_settings)
 
+    @_reported_stage
     def save_note_histograms_per_bar(self) -> None:
         self.config.histogram_per_bar_folder.mkdir(exist_ok=True)
-        for midi_file in self.config.source_folder.rglob('*.mid'):
-            try:
-                midi_functions.midi_to_histo_oct(settings.samples_per_bar, settings.half_steps_in_octave,
-                                                 settings.sampling_frequency, midi_file,
-                                                 self.config.histogram_per_bar_folder)
-            except self.intercepted_errors as e:
-                logging.debug(f'Unexpected error when processing {midi_file}: {e}')
+        job = functools.partial(midi_functions.note_events_to_histo_oct, settings.samples_per_bar,
+                                settings.half_steps_in_octave, settings.sampling_frequency,
+                                histogram_path=self.config.histogram_per_bar_folder)
+        self.__run_jobs('save_note_histograms_per_bar', job,
+                        {file: (file,) for file in self.__get_note_events_files()},
+                        lambda file: [self.config.histogram_per_bar_folder.joinpath(
+                            note_events.get_song_name(file) + '.pickle')],
+                        self.histogram_settings)
 
+    @_reported_stage
     def save_note_histograms_per_song(self) -> None:
         self.config.histogram_per_song_folder.mkdir(exist_ok=True)
-        for histogram_per_bar_file in self.config.histogram_per_bar_folder.rglob('*.pickle'):
-            midi_functions.load_histo_save_song_histo(histogram_per_bar_file, self.config.histogram_per_song_folder)
+        job = functools.partial(midi_functions.load_histo_save_song_histo,
+                                song_histogram_path=self.config.histogram_per_song_folder)
+        histogram_per_bar_files = self.config.histogram_per_bar_folder.rglob('*.pickle')
+        self.__run_jobs('save_note_histograms_per_song', job, {file: (file,) for file in histogram_per_bar_files},
+                        lambda file: [self.config.histogram_per_song_folder.joinpath(file.name)], (),
+                        intercepted_errors=())
 
+    @_reported_stage
     def save_shifted_midi_files(self) -> None:
         self.config.key_shifted_folder.mkdir(exist_ok=True)
+        jobs = dict()
         for histogram_file in self.config.histogram_per_song_folder.rglob('*.pickle'):
             song_histogram = pickle.load(open(histogram_file, 'rb'))
             key = midi_functions.song_histogram_to_key(song_histogram, settings.notes_per_key)
-            semitones_to_shift = self.__get_shift(key)
+            semitones_to_shift = midi_functions.key_to_shift(key)
             song_name = histogram_file.name.replace('.pickle', '')
-            if semitones_to_shift != 'other':
-                try:
-                    midi_functions.shift_midi(
-                        semitones_to_shift, song_name, self.config.tempo_shift_folder, self.config.key_shifted_folder)
-                except self.intercepted_errors as e:
-                    logging.debug(f'Unexpected error when processing {histogram_file}: {e}')
+            midi_file = self.config.tempo_shift_folder.joinpath(song_name)
+            if semitones_to_shift == 'other':
+                continue
+            if midi_file.exists():
+                jobs[midi_file] = (semitones_to_shift, song_name)
+            else:
+                logging.debug(f'Unexpected error when processing {histogram_file}: {midi_file} does not exist')
+        job = functools.partial(midi_functions.shift_midi, source_path=self.config.tempo_shift_folder,
+                                target_path=self.config.key_shifted_folder)
+        self.__run_jobs('save_shifted_midi_files', job, jobs,
+                        lambda midi_file: [self.config.key_shifted_folder.joinpath(midi_file.name)],
+                        ('notes_per_key',))
 
+    @_reported_stage
     def save_note_index_from_pianorolls(self) -> None:
         self.config.piano_roll_folder.mkdir(exist_ok=True)
-        for midi_file in self.config.key_shifted_folder.rglob('*.mid'):
-            intercepted_errors = (ValueError, EOFError, IndexError, OSError, KeyError, ZeroDivisionError)
-            try:
-                midi_functions.save_note_ind(midi_file, self.config.piano_roll_folder, settings.sampling_frequency)
-            except self.intercepted_errors as e:
-                logging.debug(f'Unexpected error when processing {midi_file}: {e}')
+        job = functools.partial(midi_functions.save_note_ind, target_path=self.config.piano_roll_folder,
+                                fs=settings.sampling_frequency)
+        self.__run_jobs('save_note_index_from_pianorolls', job,
+                        {midi_file: (midi_file,) for midi_file in self.config.key_shifted_folder.rglob('*.mid')},
+                        lambda midi_file: [self.config.piano_roll_folder.joinpath(midi_file.name + '.pickle')],
+                        self.pianoroll_settings, extra_stage_settings=self.note_format)
 
+    @_reported_stage
     def save_histo_oct_from_shifted_midi_folder(self) -> None:
         self.config.key_shifted_histogram_per_bar_folder.mkdir(exist_ok=True)
-        for midi_file in self.config.key_shifted_folder.rglob('*.mid'):
-            try:
-                midi_functions.midi_to_histo_oct(settings.samples_per_bar, settings.half_steps_in_octave,
-                                                 settings.sampling_frequency, midi_file,
-                                                 self.config.key_shifted_histogram_per_bar_folder)
-            except self.intercepted_errors as e:
-                logging.debug(f'Unexpected error when processing {midi_file}: {e}')
+        job = functools.partial(self.__get_midi_to_histo_oct(), settings.samples_per_bar,
+                                settings.half_steps_in_octave, settings.sampling_frequency,
+                                histogram_path=self.config.key_shifted_histogram_per_bar_folder)
+        self.__run_jobs('save_histo_oct_from_shifted_midi_folder', job,
+                        {midi_file: (midi_file,) for midi_file in self.config.key_shifted_folder.rglob('*.mid')},
+                        lambda midi_file: [
+                            self.config.key_shifted_histogram_per_bar_folder.joinpath(midi_file.name + '.pickle')],
+                        self.histogram_settings)
 
+    @_reported_stage
     def save_chords_from_histogram(self) -> None:
         self.config.chords_folder.mkdir(exist_ok=True)
-        for histogram_file in self.config.key_shifted_histogram_per_bar_folder.rglob('*.pickle'):
-            midi_functions.chord_histogram_to_chords(settings.notes_per_chord, histogram_file, self.config.chords_folder)
+        job = functools.partial(midi_functions.chord_histogram_to_chords, settings.notes_per_chord,
+                                chords_path=self.config.chords_folder)
+        histogram_files = self.config.key_shifted_histogram_per_bar_folder.rglob('*.pickle')
+        # the workers return the chord counts of their songs, which are merged into the counts of the vocabulary
+        chord_counts = self.__get_chord_counts()
+        self.__run_jobs('save_chords_from_histogram', job, {file: (file,) for file in histogram_files},
+                        lambda file: [self.config.chords_folder.joinpath(file.name)], ('notes_per_chord',),
+                        intercepted_errors=(), extra_stage_settings=self.chord_format,
+                        on_result=lambda file, song_counts: chord_counts.set_song(file.name, song_counts))
+        self.__update_chord_counts(chord_counts)
 
+    @_reported_stage
+    def save_songs_fused(self, intermediates: Iterable[str] = ()) -> None:
+        # fused alternative to the stages 1 to 7, every song is processed in memory from its note events,
+        # intermediate results are only written for the config folders named in intermediates
+        intermediates = frozenset(intermediates)
+        unknown_intermediates = intermediates.difference(song_preprocessing.INTERMEDIATES)
+        if unknown_intermediates:
+            raise ValueError(f'Unknown intermediates: {sorted(unknown_intermediates)}')
+        for folder in intermediates.union({'piano_roll_folder', 'chords_folder'}):
+            getattr(self.config, folder).mkdir(exist_ok=True)
+        job = functools.partial(song_preprocessing.preprocess_song, config=self.config, intermediates=intermediates)
+        chord_counts = self.__get_chord_counts()
+
+        def add_song_counts(note_events_file: Path, song_counts: Optional[list]) -> None:
+            # songs that are not in a diatonic key have no chords
+            if song_counts is not None:
+                chord_counts.set_song(note_events.get_song_name(note_events_file) + '.pickle', song_counts)
+
+        self.__run_jobs('save_songs_fused', job, {file: (file,) for file in self.__get_note_events_files()},
+                        functools.partial(song_preprocessing.get_outputs, config=self.config,
+                                          intermediates=intermediates),
+                        self.tempo_settings + self.histogram_settings + ('notes_per_key', 'notes_per_chord'),
+                        extra_stage_settings={'intermediates': sorted(intermediates), **self.chord_format,
+                                              **self.note_format},
+                        on_result=add_song_counts)
+        self.__update_chord_counts(chord_counts)
+
+    @_reported_stage
     def make_chord_dict(self, num_chords: int) -> None:
         self.config.dict_path.mkdir(exist_ok=True)
-        cntr = self.__count_chords(self.config.chords_folder, num_chords)
+        # the chord counts were collected by the chord extraction, only chord files that are not counted yet are read
+        chord_counts = self.__get_chord_counts()
+        self.__update_chord_counts(chord_counts)
+        # the dictionary depends on the counts of all songs, so the whole chords folder is a single manifest entry
+        manifest = self.__get_manifest('make_chord_dict', ('unknown_chord_tag',), {'num_chords': num_chords})
+        counts_file = self.config.dict_path.joinpath(CHORD_COUNTS_FILE)
+        source_hash = get_content_hash(counts_file)
+        outputs = [self.config.dict_path.joinpath(self.config.chord_dict_name),
+                   self.config.dict_path.joinpath(self.config.index_dict_name)]
+        if manifest.is_up_to_date(self.config.chords_folder, source_hash):
+            logging.info('Chord dictionary is up to date')
+            self.stage_report.files_skipped += 1
+            # saved like the manifests of the other stages, its time is when the stage was last up to date
+            manifest.save()
+            return
+        cntr = chord_counts.get_most_common(num_chords - 1)
         chord_to_index = dict()
         chord_to_index[settings.unknown_chord_tag] = 0
-        for chord, _ in cntr:
-            chord_to_index[chord] = len(chord_to_index)
+        for chord_bitmask, _ in cntr:
+            chord_to_index[midi_functions.bitmask_to_chord(chord_bitmask)] = len(chord_to_index)
         index_to_chord = {v: k for k, v in chord_to_index.items()}
-        pickle.dump(chord_to_index, open(self.config.dict_path.joinpath(self.config.chord_dict_name), 'wb'))
-        pickle.dump(index_to_chord, open(self.config.dict_path.joinpath(self.config.index_dict_name), 'wb'))
+        pickle.dump(chord_to_index, open(outputs[0], 'wb'))
+        pickle.dump(index_to_chord, open(outputs[1], 'wb'))
+        self.stage_report.add_read_files([counts_file])
+        self.stage_report.add_written_files(outputs)
+        manifest.record(self.config.chords_folder, source_hash, outputs, None)
+        manifest.save()
 
+    @_reported_stage
     def save_chord_index_sequence(self) -> None:
         chord_to_index, _ = self.__get_chord_dict()
         self.config.chords_index_folder.mkdir(exist_ok=True)
-        for chords_file in self.config.chords_folder.rglob('*.pickle'):
-            midi_functions.chords_to_index_save(chords_file, self.config.chords_index_folder, chord_to_index)
-
-    def __get_shift(self, scale):
-        diatonic_scales, harmonic_scales, melodic_scales, blues_scales = self.__get_scales()
-        if scale in diatonic_scales:
-            return diatonic_scales.index(scale)
-        #    elif scale in harmonic_scales:
-        #        return harmonic_scales.index(scale)
-        #    elif scale in melodic_scales:
-        #        return melodic_scales.index(scale)
+        job = functools.partial(midi_functions.chords_to_index_save,
+                                chords_index_folder=self.config.chords_index_folder,
+                                chord_index_table=midi_functions.get_chord_index_table(chord_to_index))
+        chord_dict_hash = get_content_hash(self.config.dict_path.joinpath(self.config.chord_dict_name))
+        self.__run_jobs('save_chord_index_sequence', job,
+                        {chords_file: (chords_file,) for chords_file in self.config.chords_folder.rglob('*.pickle')},
+                        lambda chords_file: [self.config.chords_index_folder.joinpath(chords_file.name)], (),
+                        intercepted_errors=(), extra_stage_settings={'chord_dict': chord_dict_hash})
+
+    @_reported_stage
+    def save_corpora(self) -> None:
+        # consolidates the per song pickle files used for training into memory mapped corpora
+        corpora = {
+            'chords_index': (self.config.chords_index_folder, corpus.chords_index_to_array, np.int64, ()),
+            'chords': (self.config.chords_folder, corpus.chord_bitmasks_to_array, np.uint16, ()),
+            'note_index': (self.config.piano_roll_folder, corpus.packed_notes_to_array, np.uint8, (128 // 8,)),
+        }
+        self.config.corpus_folder.mkdir(exist_ok=True)
+        for corpus_name, (pickle_folder, to_array, dtype, row_shape) in corpora.items():
+            corpus_folder = self.config.corpus_folder.joinpath(corpus_name)
+            manifest = self.__get_manifest('save_corpora_' + corpus_name, (), None)
+            pickle_files = sorted(pickle_folder.rglob('*.pickle'))
+            source_hash = get_files_hash(pickle_files)
+            if manifest.is_up_to_date(pickle_folder, source_hash):
+                logging.info(f'Corpus {corpus_name} is up to date')
+                self.stage_report.files_skipped += len(pickle_files)
+                manifest.save()
+                continue
+            corpus.convert_pickle_folder(pickle_folder, corpus_folder, to_array, dtype, row_shape)
+            self.stage_report.add_read_files(pickle_files)
+            self.stage_report.add_written_files(list(corpus_folder.iterdir()))
+            manifest.record(pickle_folder, source_hash, [corpus_folder.joinpath(corpus.META_FILE)], None)
+            manifest.save()
+
+    def __run_jobs(self, stage: str, job: Callable, jobs: dict[Path, tuple], get_outputs: Callable[[Path], list[Path]],
+                   setting_names: tuple, intercepted_errors: Optional[tuple] = None,
+                   extra_stage_settings: Optional[dict] = None,
+                   on_result: Optional[Callable[[Path, object], None]] = None) -> None:
+        # jobs maps the source file of a job to its arguments, the source file is reported on errors and
+        # together with the arguments and the settings decides whether the outputs of a previous run are reused,
+        # files are processed and reported in sorted order so that runs stay comparable,
+        # on_result is called in the calling process with the source file and the result of every successful job
+        if intercepted_errors is None:
+            intercepted_errors = self.intercepted_errors
+        manifest = self.__get_manifest(stage, setting_names, extra_stage_settings)
+        manifest.remove_missing_sources(set(jobs))
+        source_hashes = {file: get_content_hash(file, jobs[file]) for file in jobs}
+        files = [file for file in sorted(jobs) if not manifest.is_up_to_date(file, source_hashes[file])]
+        self.__log_skipped_files(manifest, sorted(set(jobs).difference(files)))
+        self.stage_report.files_skipped += len(jobs) - len(files)
+        for file in files:
+            manifest.remove_outputs(file)
+
+        job_args = [jobs[file] for file in files]
+        in_workers = self.config.num_workers > 1 and len(files) > 1
+        # jobs in the calling process are covered by the profiler of the stage
+        profile = in_workers and stage in self.config.profiled_stages
+        run_job = functools.partial(_run_job, job, intercepted_errors, profile)
+        if in_workers:
+            with ProcessPoolExecutor(max_workers=self.config.num_workers) as executor:
+                results = list(executor.map(run_job, job_args, chunksize=self.__get_chunk_size(len(files))))
         else:
-            return 'other'
+            results = map(run_job, job_args)
+        for file, (result, error_type, error, seconds, cpu_seconds, profile_stats) in zip(files, results):
+            if error is not None:
+                logging.debug(f'Unexpected error when processing {file}: {error_type}: {error}')
+            elif on_result is not None:
+                on_result(file, result)
+            outputs = [output for output in get_outputs(file) if output.exists()]
+            manifest.record(file, source_hashes[file], outputs, error)
+            self.stage_report.add_file(file, seconds, cpu_seconds, error_type, outputs)
+            if profile_stats is not None:
+                self.stage_report.worker_profiles.append(profile_stats)
+        manifest.save()
+
+    def __get_note_events_files(self) -> list[Path]:
+        if self.config.note_events_folder is None:
+            raise ValueError('The note events folder is not set, the note events are read instead of the midi files')
+        return sorted(self.config.note_events_folder.rglob('*' + note_events.NOTE_EVENTS_SUFFIX))
+
+    @staticmethod
+    def __get_midi_to_histo_oct() -> Callable:
+        if settings.event_based_histograms:
+            return midi_functions.midi_to_histo_oct_event_based
+        return midi_functions.midi_to_histo_oct
+
+    def __get_manifest(self, stage: str, setting_names: tuple, extra_stage_settings: Optional[dict]) -> StageManifest:
+        stage_settings = {name: getattr(settings, name) for name in setting_names}
+        stage_settings.update(extra_stage_settings or dict())
+        if self.config.manifest_folder is None:
+            return StageManifest(None, stage_settings)
+        self.config.manifest_folder.mkdir(exist_ok=True)
+        return StageManifest(self.config.manifest_folder.joinpath(stage + '.json'), stage_settings)
+
+    @staticmethod
+    def __log_skipped_files(manifest: StageManifest, skipped_files: list[Path]) -> None:
+        failed_files = [file for file in skipped_files if manifest.is_failed(file)]
+        if skipped_files:
+            logging.info(f'Skipping {len(skipped_files)} unchanged files, {len(failed_files)} of them failed before')
+
+    def __get_chunk_size(self, num_jobs: int) -> int:
+        if self.config.chunk_size is not None:
+            return self.config.chunk_size
+        # a few chunks per worker keeps the load balanced without paying the transfer overhead per file
+        return max(1, num_jobs // (self.config.num_workers * 4))
 
     def __get_chord_dict(self) -> tuple[dict, dict]:
         chord_to_index = pickle.load(open(self.config.dict_path.joinpath(self.config.chord_dict_name), 'rb'))
         index_to_chord = pickle.load(open(self.config.dict_path.joinpath(self.config.index_dict_name), 'rb'))
         return chord_to_index, index_to_chord
 
-    @staticmethod
-    def __get_scales() -> tuple:
-        # get all scales for every root note
-        diatonic_scale = tuple((0, 2, 4, 5, 7, 9, 11))
-        diatonic_scales = []
-        for i in range(0, 12):
-            diatonic_scales.append(tuple(np.sort((np.array(diatonic_scale) + i) % 12)))
-
-        harmonic_scale = tuple((0, 2, 4, 5, 8, 9, 11))
-        harmonic_scales = []
-        for i in range(0, 12):
-            harmonic_scales.append(tuple(np.sort((np.array(harmonic_scale) + i) % 12)))
-
-        melodic_scale = tuple((0, 2, 4, 6, 8, 9, 11))
-        melodic_scales = []
-        for i in range(0, 12):
-            melodic_scales.append(tuple(np.sort((np.array(melodic_scale) + i) % 12)))
-        blues_scale = tuple((0, 3, 5, 6, 7, 10))
-        blues_scales = []
-        for i in range(0, 12):
-            blues_scales.append(tuple(np.sort((np.array(blues_scale) + i) % 12)))
-
-        return diatonic_scales, harmonic_scales, melodic_scales, blues_scales
+    def __get_chord_counts(self) -> ChordCounts:
+        return ChordCounts(self.config.dict_path.joinpath(CHORD_COUNTS_FILE))
 
-    @staticmethod
-    def __count_chords(chords_folder, num_chords) -> list:
-        chord_cntr = Counter()
-        for path, subdirs, files in os.walk(chords_folder):
-            for name in files:
-                _path = path.replace('\\', '/') + '/'
-                _name = name.replace('\\', '/')
-                chords = pickle.load(open(_path + _name, 'rb'))
-                for chord in chords:
-                    if chord in chord_cntr:
-                        chord_cntr[chord] += 1
-                    else:
-                        chord_cntr[chord] = 1
-        return chord_cntr.most_common(n=num_chords - 1)
+    def __update_chord_counts(self, chord_counts: ChordCounts) -> None:
+        # removes the counts of songs without chord file and counts the chord files that were not counted yet,
+        # e.g. after a failed song or when the counts were deleted
+        chord_files = {chord_file.name: chord_file for chord_file in self.config.chords_folder.rglob('*.pickle')}
+        chord_counts.keep_songs(set(chord_files))
+        for song in chord_counts.get_missing_songs(set(chord_files)):
+            chord_bitmasks = pickle.load(open(chord_files[song], 'rb'))
+            chord_counts.set_song(song, midi_functions.count_song_chords(chord_bitmasks))
+        chord_counts.save()
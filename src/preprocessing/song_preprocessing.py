@@ -0,0 +1,78 @@
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import _pickle as pickle
+
+import settings
+from utils import midi_functions, note_events
+from preprocessing.midi_data_preprocessor_config import MidiDataPreprocessorConfig
+
+# intermediate results of the staged pipeline that the fused pipeline only writes on request,
+# named after the folder of the MidiDataPreprocessorConfig they are written to
+INTERMEDIATES = ('tempo_shift_folder', 'histogram_per_bar_folder', 'histogram_per_song_folder',
+                 'key_shifted_folder', 'key_shifted_histogram_per_bar_folder')
+
+
+def preprocess_song(note_events_file: Path, config: MidiDataPreprocessorConfig,
+                    intermediates: frozenset) -> Optional[list]:
+    # runs stages 1 to 7 for a single song in memory from its parsed note events, returns the chord counts of the
+    # song for the chord vocabulary or None if the song is not in a diatonic key
+    song_name = note_events.get_song_name(note_events_file)
+    song_note_events = note_events.load_note_events(note_events_file)
+    midi = note_events.note_events_to_pretty_midi(song_note_events)
+
+    histogram_per_bar = midi_functions.pretty_midi_to_histogram_per_bar(
+        midi, settings.samples_per_bar, settings.half_steps_in_octave, settings.sampling_frequency)
+    _save_intermediate(histogram_per_bar, config, intermediates, 'histogram_per_bar_folder', song_name)
+    song_histogram = np.sum(histogram_per_bar, axis=1)
+    _save_intermediate(song_histogram, config, intermediates, 'histogram_per_song_folder', song_name)
+
+    tempo_shifted_midi = note_events.note_events_to_tempo_shifted_pretty_midi(song_note_events, settings.midi_bpm)
+    if 'tempo_shift_folder' in intermediates:
+        tempo_shifted_midi.write(str(config.tempo_shift_folder.joinpath(song_name)))
+
+    key = midi_functions.song_histogram_to_key(song_histogram, settings.notes_per_key)
+    semitones_to_shift = midi_functions.key_to_shift(key)
+    if semitones_to_shift == 'other':
+        return None
+    midi_functions.transpose_pretty_midi(tempo_shifted_midi, semitones_to_shift)
+    if 'key_shifted_folder' in intermediates:
+        tempo_shifted_midi.write(str(config.key_shifted_folder.joinpath(song_name)))
+
+    pianoroll = midi_functions.get_pianoroll_of_pretty_midi(tempo_shifted_midi, settings.sampling_frequency)
+    packed_notes = midi_functions.pianoroll_to_packed_notes(pianoroll)
+    pickle.dump(packed_notes, open(config.piano_roll_folder.joinpath(song_name + '.pickle'), 'wb'))
+
+    # the same histograms as save_histo_oct_from_shifted_midi_folder, the sampled ones reuse the pianoroll
+    if settings.event_based_histograms:
+        shifted_histogram_per_bar = midi_functions.pretty_midi_to_histo_oct(
+            tempo_shifted_midi, settings.samples_per_bar, settings.half_steps_in_octave, settings.sampling_frequency)
+    else:
+        shifted_histogram_per_bar = midi_functions.pianoroll_to_histo_oct(
+            pianoroll, settings.samples_per_bar, settings.half_steps_in_octave)
+    _save_intermediate(
+        shifted_histogram_per_bar, config, intermediates, 'key_shifted_histogram_per_bar_folder', song_name)
+
+    chord_bitmasks = midi_functions.bar_histogram_to_chord_bitmasks(
+        shifted_histogram_per_bar, settings.notes_per_chord)
+    pickle.dump(chord_bitmasks, open(config.chords_folder.joinpath(song_name + '.pickle'), 'wb'))
+    return midi_functions.count_song_chords(chord_bitmasks)
+
+
+def get_outputs(note_events_file: Path, config: MidiDataPreprocessorConfig, intermediates: frozenset) -> list[Path]:
+    song_name = note_events.get_song_name(note_events_file)
+    outputs = [config.piano_roll_folder.joinpath(song_name + '.pickle'),
+               config.chords_folder.joinpath(song_name + '.pickle')]
+    for folder in intermediates:
+        if folder in ('tempo_shift_folder', 'key_shifted_folder'):
+            outputs.append(getattr(config, folder).joinpath(song_name))
+        else:
+            outputs.append(getattr(config, folder).joinpath(song_name + '.pickle'))
+    return outputs
+
+
+def _save_intermediate(data, config: MidiDataPreprocessorConfig, intermediates: frozenset, folder: str,
+                        song_name: str) -> None:
+    if folder in intermediates:
+        pickle.dump(data, open(getattr(config, folder).joinpath(song_name + '.pickle'), 'wb'))
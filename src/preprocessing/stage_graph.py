@@ -0,0 +1,140 @@
+from pathlib import Path
+from typing import Iterable, Optional
+
+import settings
+from preprocessing.midi_data_preprocessor_config import MidiDataPreprocessorConfig
+
+# The stages of the preprocessing as a dependency graph: every stage reads and writes config folders, a stage
+# depends on the stages that write the folders it reads. This module only needs the config and the settings,
+# so the graph can be inspected without importing the midi and numpy dependencies of the stages.
+
+
+class Stage:
+    def __init__(self, name: str, description: str, inputs: tuple[str, ...], outputs: tuple[str, ...]):
+        # name of the MidiDataPreprocessor method, its manifests are named after it
+        self.name = name
+        self.description = description
+        # config folders the stage reads and writes, the main input first
+        self.inputs = inputs
+        self.outputs = outputs
+
+
+SAVE_NOTE_EVENTS = Stage('save_note_events', 'Parse the notes of all the midi files once into note events',
+                         ('source_folder',), ('note_events_folder',))
+MAKE_CHORD_DICT = Stage('make_chord_dict', 'Make a chord dictionary that maps the most used chords to an index',
+                        ('chords_folder',), ('dict_path',))
+SAVE_CHORD_INDEX_SEQUENCE = Stage('save_chord_index_sequence', 'Create chord-index sequence for each song',
+                                  ('chords_folder', 'dict_path'), ('chords_index_folder',))
+SAVE_CORPORA = Stage('save_corpora',
+                     'Consolidate the chord-index sequences, chords and pianorolls into memory mapped corpora',
+                     ('chords_index_folder', 'chords_folder', 'piano_roll_folder'), ('corpus_folder',))
+
+STAGED_PIPELINE = (
+    SAVE_NOTE_EVENTS,
+    Stage('save_tempo_shifted_midi_files', 'Shift the tempo of all the midi files to 120 bmp',
+          ('source_folder',), ('tempo_shift_folder',)),
+    Stage('save_note_histograms_per_bar', 'Create a histogram of which notes are played for each bar of every song',
+          ('note_events_folder',), ('histogram_per_bar_folder',)),
+    Stage('save_note_histograms_per_song', 'Create a histogram of which notes are played for each song',
+          ('histogram_per_bar_folder',), ('histogram_per_song_folder',)),
+    Stage('save_shifted_midi_files', 'Shift all the notes of the midi files to the key of C major',
+          ('tempo_shift_folder', 'histogram_per_song_folder'), ('key_shifted_folder',)),
+    Stage('save_note_index_from_pianorolls', 'Create a pianoroll representation of tempo/key shifted midi files',
+          ('key_shifted_folder',), ('piano_roll_folder',)),
+    Stage('save_histo_oct_from_shifted_midi_folder',
+          'Create a histogram of which notes are played for each bar of every key shifted song',
+          ('key_shifted_folder',), ('key_shifted_histogram_per_bar_folder',)),
+    Stage('save_chords_from_histogram', 'Extract a chord for each bar from histogram data',
+          ('key_shifted_histogram_per_bar_folder',), ('chords_folder', 'dict_path')),
+    MAKE_CHORD_DICT,
+    SAVE_CHORD_INDEX_SEQUENCE,
+    SAVE_CORPORA,
+)
+FUSED_PIPELINE = (
+    SAVE_NOTE_EVENTS,
+    Stage('save_songs_fused', 'Shift tempo and key, create the pianorolls and extract the chords of every song',
+          ('note_events_folder',), ('piano_roll_folder', 'chords_folder', 'dict_path')),
+    MAKE_CHORD_DICT,
+    SAVE_CHORD_INDEX_SEQUENCE,
+    SAVE_CORPORA,
+)
+
+
+def get_pipeline(fused: bool) -> tuple[Stage, ...]:
+    return FUSED_PIPELINE if fused else STAGED_PIPELINE
+
+
+def get_stage_arguments(stage: Stage) -> tuple:
+    # arguments of the stage method, taken from the settings
+    if stage.name == 'make_chord_dict':
+        return settings.num_chords,
+    if stage.name == 'save_songs_fused':
+        return settings.fused_preprocessing_intermediates,
+    return ()
+
+
+def get_stage(pipeline: tuple[Stage, ...], name: str) -> Stage:
+    for stage in pipeline:
+        if stage.name == name:
+            return stage
+    raise ValueError(f'Unknown stage {name}, the stages are {", ".join(stage.name for stage in pipeline)}')
+
+
+def get_stage_range(pipeline: tuple[Stage, ...], first: Optional[str], last: Optional[str]) -> list[Stage]:
+    # the stages from first to last in the order of the pipeline, both included
+    first_index = 0 if first is None else pipeline.index(get_stage(pipeline, first))
+    last_index = len(pipeline) - 1 if last is None else pipeline.index(get_stage(pipeline, last))
+    if first_index > last_index:
+        raise ValueError(f'Stage {first} comes after stage {last}')
+    return list(pipeline[first_index:last_index + 1])
+
+
+def get_dependencies(pipeline: tuple[Stage, ...], stage: Stage) -> list[Stage]:
+    # the earlier stages that write a folder the stage reads
+    earlier_stages = pipeline[:pipeline.index(stage)]
+    return [earlier_stage for earlier_stage in earlier_stages if set(earlier_stage.outputs).intersection(stage.inputs)]
+
+
+def is_out_of_date(stage: Stage, config: MidiDataPreprocessorConfig) -> bool:
+    # like make: a stage is out of date if one of its inputs or the settings changed after its manifests were
+    # written, the manifests of the stage then decide which files are actually processed again
+    if config.manifest_folder is None:
+        return True
+    manifests = list(config.manifest_folder.glob(stage.name + '.json')) +\
+        list(config.manifest_folder.glob(stage.name + '_*.json'))
+    outputs = [getattr(config, folder) for folder in stage.outputs]
+    if not manifests or not all(output.exists() for output in outputs):
+        return True
+    manifest_time = min(manifest.stat().st_mtime for manifest in manifests)
+    input_paths = [Path(settings.__file__)]
+    for folder in stage.inputs:
+        input_paths += _get_paths(getattr(config, folder))
+    return any(path.stat().st_mtime > manifest_time for path in input_paths)
+
+
+def get_stages_to_run(pipeline: tuple[Stage, ...], stages: Iterable[Stage], config: MidiDataPreprocessorConfig,
+                      out_of_date_only: bool) -> list[Stage]:
+    # without out_of_date_only the given stages, otherwise the given stages and the stages they depend on
+    # that are out of date or depend on a stage that is run
+    stages = list(stages)
+    if not out_of_date_only:
+        return stages
+    targets = set(stage.name for stage in stages)
+    for stage in reversed(pipeline):
+        if stage.name in targets:
+            targets.update(dependency.name for dependency in get_dependencies(pipeline, stage))
+    stages_to_run = []
+    for stage in pipeline:
+        if stage.name not in targets:
+            continue
+        depends_on_run_stage = any(dependency in stages_to_run for dependency in get_dependencies(pipeline, stage))
+        if depends_on_run_stage or is_out_of_date(stage, config):
+            stages_to_run.append(stage)
+    return stages_to_run
+
+
+def _get_paths(folder: Path) -> list[Path]:
+    # the folder, its files and sub folders, a deleted file changes the modification time of its folder
+    if not folder.exists():
+        return []
+    return [folder] + list(folder.rglob('*'))
@@ -0,0 +1,65 @@
+import json
+import hashlib
+from pathlib import Path
+from typing import Optional
+
+
+def get_files_hash(files: list[Path]) -> str:
+    files_hash = hashlib.blake2b(digest_size=16)
+    for file in files:
+        files_hash.update(get_content_hash(file, file.name).encode())
+    return files_hash.hexdigest()
+
+
+def get_content_hash(file: Path, *extra) -> str:
+    content_hash = hashlib.blake2b(digest_size=16)
+    content_hash.update(file.read_bytes())
+    for value in extra:
+        content_hash.update(repr(value).encode())
+    return content_hash.hexdigest()
+
+
+class StageManifest:
+    # Remembers for every source file of a stage from which content and settings its outputs were computed,
+    # or with which error it failed, so that unchanged files are neither reprocessed nor retried.
+    # Without a path nothing is persisted and every file is processed.
+    def __init__(self, path: Optional[Path], stage_settings: dict):
+        self.path = path
+        self.stage_settings = json.loads(json.dumps(stage_settings, default=str))
+        self.entries = self.__load_entries()
+
+    def is_up_to_date(self, source: Path, source_hash: str) -> bool:
+        entry = self.entries.get(str(source))
+        if entry is None or entry['source_hash'] != source_hash or entry['settings'] != self.stage_settings:
+            return False
+        return all(Path(output).exists() for output in entry['outputs'])
+
+    def is_failed(self, source: Path) -> bool:
+        return self.entries[str(source)]['error'] is not None
+
+    def record(self, source: Path, source_hash: str, outputs: list[Path], error: Optional[str]) -> None:
+        self.entries[str(source)] = {
+            'source_hash': source_hash,
+            'settings': self.stage_settings,
+            'outputs': [str(output) for output in outputs],
+            'error': error,
+        }
+
+    def remove_outputs(self, source: Path) -> None:
+        # outputs of a previous run must not survive if the source now fails
+        for output in self.entries.pop(str(source), {'outputs': []})['outputs']:
+            Path(output).unlink(missing_ok=True)
+
+    def remove_missing_sources(self, sources: set[Path]) -> None:
+        # outputs of deleted or no longer processed source files would otherwise leak into the later stages
+        for source in set(self.entries).difference(str(source) for source in sources):
+            self.remove_outputs(Path(source))
+
+    def save(self) -> None:
+        if self.path is not None:
+            json.dump(self.entries, open(self.path, 'w'), indent=1)
+
+    def __load_entries(self) -> dict:
+        if self.path is None or not self.path.exists():
+            return dict()
+        return json.load(open(self.path, 'r'))
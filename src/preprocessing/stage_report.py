@@ -0,0 +1,156 @@
+import json
+import time
+import pstats
+import logging
+import cProfile
+import resource
+import numpy as np
+from pathlib import Path
+from typing import Optional
+from collections import Counter
+
+REPORT_FILE = 'preprocessing_report.json'
+
+
+def get_cpu_seconds() -> float:
+    # cpu time of this process and of its terminated children, the workers of a stage are joined when it ends
+    cpu_seconds = 0.
+    for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN):
+        usage = resource.getrusage(who)
+        cpu_seconds += usage.ru_utime + usage.ru_stime
+    return cpu_seconds
+
+
+def get_profile_stats(profiler: Optional[cProfile.Profile]) -> Optional[dict]:
+    # the stats of a profiler can be sent from a worker process to the parent, the profiler itself can not
+    if profiler is None:
+        return None
+    profiler.create_stats()
+    return profiler.stats
+
+
+class _ProfileStats:
+    # stats of a worker in the form pstats loads them from a profiler
+    def __init__(self, stats: dict):
+        self.stats = stats
+
+    def create_stats(self) -> None:
+        pass
+
+
+class StageReport:
+    # Wall and cpu time, processed, skipped and failed files and the bytes read and written of one stage.
+    # The times of the single files are measured around the job in the worker processes.
+    def __init__(self, stage: str, num_slowest_files: int):
+        self.stage = stage
+        self.num_slowest_files = num_slowest_files
+        self.wall_seconds = 0.
+        self.cpu_seconds = 0.
+        self.files_processed = 0
+        self.files_skipped = 0
+        self.failures = Counter()
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.file_times = dict()
+        # profiles of the jobs that ran in worker processes
+        self.worker_profiles = []
+        self.__start_wall_seconds = time.perf_counter()
+        self.__start_cpu_seconds = get_cpu_seconds()
+
+    def add_file(self, file: Path, seconds: float, cpu_seconds: float, error_type: Optional[str],
+                 outputs: list[Path]) -> None:
+        self.files_processed += 1
+        if error_type is not None:
+            self.failures[error_type] += 1
+        self.bytes_read += file.stat().st_size
+        self.bytes_written += sum(output.stat().st_size for output in outputs if output.is_file())
+        self.file_times[str(file)] = {'seconds': seconds, 'cpu_seconds': cpu_seconds, 'error_type': error_type}
+
+    def add_read_files(self, files: list[Path]) -> None:
+        # files read by stages that do not process their files one by one
+        self.files_processed += len(files)
+        self.bytes_read += sum(file.stat().st_size for file in files)
+
+    def add_written_files(self, files: list[Path]) -> None:
+        self.bytes_written += sum(file.stat().st_size for file in files if file.is_file())
+
+    def finish(self) -> None:
+        self.wall_seconds = time.perf_counter() - self.__start_wall_seconds
+        self.cpu_seconds = get_cpu_seconds() - self.__start_cpu_seconds
+
+    def get_slowest_files(self) -> list[dict]:
+        slowest_files = sorted(self.file_times, key=lambda file: self.file_times[file]['seconds'], reverse=True)
+        return [{'file': file, **self.file_times[file]} for file in slowest_files[:self.num_slowest_files]]
+
+    def to_dict(self) -> dict:
+        return {
+            'stage': self.stage,
+            'wall_seconds': self.wall_seconds,
+            'cpu_seconds': self.cpu_seconds,
+            'files_processed': self.files_processed,
+            'files_skipped': self.files_skipped,
+            'files_failed': sum(self.failures.values()),
+            'failures': dict(self.failures.most_common()),
+            'bytes_read': self.bytes_read,
+            'bytes_written': self.bytes_written,
+            'slowest_files': self.get_slowest_files(),
+        }
+
+
+class PreprocessingReport:
+    # Collects the stage reports of a preprocessing run, logs a summary per stage and writes them to
+    # report_folder/preprocessing_report.json after every stage, so an aborted run still leaves a report.
+    # Without a report folder the summaries are only logged.
+    def __init__(self, report_folder: Optional[Path], tensorboard: bool = False, num_slowest_files: int = 10):
+        self.report_folder = report_folder
+        self.tensorboard = tensorboard and report_folder is not None
+        self.num_slowest_files = num_slowest_files
+        self.started = time.strftime('%Y-%m-%dT%H:%M:%S')
+        self.run_name = time.strftime('%Y%m%d_%H%M%S')
+        self.stage_reports = []
+        self.tensorboard_writer = None
+
+    def start_stage(self, stage: str) -> StageReport:
+        return StageReport(stage, self.num_slowest_files)
+
+    def finish_stage(self, stage_report: StageReport) -> None:
+        stage_report.finish()
+        self.stage_reports.append(stage_report)
+        logging.info(f'{stage_report.stage}: {stage_report.files_processed} files in '
+                     f'{stage_report.wall_seconds:.1f}s, {stage_report.cpu_seconds:.1f}s cpu, '
+                     f'{sum(stage_report.failures.values())} failed, {stage_report.files_skipped} skipped')
+        if self.report_folder is None:
+            return
+        self.report_folder.mkdir(parents=True, exist_ok=True)
+        report = {'started': self.started, 'stages': [report.to_dict() for report in self.stage_reports]}
+        json.dump(report, open(self.report_folder.joinpath(REPORT_FILE), 'w'), indent=1)
+        if self.tensorboard:
+            self.__add_to_tensorboard(stage_report, len(self.stage_reports) - 1)
+
+    def save_profile(self, stage: str, profiler: cProfile.Profile, worker_profiles: list[dict]) -> Optional[Path]:
+        # merges the profile of the calling process with the ones of the workers, the file can be read with
+        # pstats or snakeviz
+        if self.report_folder is None:
+            return None
+        self.report_folder.mkdir(parents=True, exist_ok=True)
+        profile_file = self.report_folder.joinpath(stage + '.prof')
+        stats = pstats.Stats(profiler)
+        stats.add(*(_ProfileStats(worker_profile) for worker_profile in worker_profiles))
+        stats.dump_stats(profile_file)
+        return profile_file
+
+    def __add_to_tensorboard(self, stage_report: StageReport, stage_index: int) -> None:
+        if self.tensorboard_writer is None:
+            # imported on demand, the preprocessing does not need torch otherwise
+            from torch.utils.tensorboard import SummaryWriter
+            self.tensorboard_writer = SummaryWriter(str(self.report_folder.joinpath('tensorboard', self.run_name)))
+        stage = f'{stage_index}_{stage_report.stage}'
+        for name, value in stage_report.to_dict().items():
+            if isinstance(value, (int, float)):
+                self.tensorboard_writer.add_scalar(f'{stage}/{name}', value)
+        file_seconds = np.array([file_time['seconds'] for file_time in stage_report.file_times.values()])
+        if len(file_seconds) > 0:
+            self.tensorboard_writer.add_histogram(f'{stage}/file_seconds', file_seconds)
+        self.tensorboard_writer.add_text(f'{stage}/slowest_files', '  \n'.join(
+            f'{file["seconds"]:.3f}s {file["file"]}' for file in stage_report.get_slowest_files()))
+        self.tensorboard_writer.flush()
@@ -0,0 +1,80 @@
+import os
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+
+from benchmarks.synthetic_midi_corpus import SyntheticCorpusConfig, generate_synthetic_corpus
+from benchmarks.preprocessing_benchmark import benchmark_preprocessing, get_benchmark_config
+from benchmarks.pianoroll_memory_benchmark import benchmark_pianoroll_memory
+
+logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.INFO)
+
+
+def get_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Benchmark the preprocessing and training on a synthetic corpus')
+    parser.add_argument('--num-songs', type=int, default=100)
+    parser.add_argument('--bars-per-song', type=int, default=64)
+    parser.add_argument('--polyphony', type=int, default=4)
+    parser.add_argument('--tempo-changes-per-song', type=int, default=4)
+    parser.add_argument('--num-instruments', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--num-workers', type=int, default=os.cpu_count())
+    parser.add_argument('--fused', action='store_true', help='benchmark the fused preprocessing')
+    parser.add_argument('--memory-songs', type=int, default=10,
+                        help='songs whose pianoroll peak memory is measured with the baseline and compact paths')
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--window-length', type=int, default=None)
+    parser.add_argument('--num-epochs', type=int, default=2)
+    parser.add_argument('--output-folder', type=Path, default=Path('../benchmarks'))
+    return parser.parse_args()
+
+
+def get_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ''
+
+
+if __name__ == '__main__':
+    arguments = get_arguments()
+    corpus_config = SyntheticCorpusConfig(arguments.num_songs, arguments.bars_per_song, arguments.polyphony,
+                                          arguments.tempo_changes_per_song, arguments.num_instruments,
+                                          seed=arguments.seed)
+    data_folder = Path(tempfile.mkdtemp())
+    try:
+        config = get_benchmark_config(data_folder, arguments.num_workers)
+        logging.info(f'Generating {arguments.num_songs} synthetic songs')
+        generate_synthetic_corpus(config.source_folder, corpus_config)
+        logging.info('Benchmarking the preprocessing')
+        preprocessing_results = benchmark_preprocessing(config, arguments.fused)
+        logging.info('Benchmarking the pianoroll memory')
+        pianoroll_memory_results = benchmark_pianoroll_memory(
+            sorted(config.source_folder.glob('*.mid'))[:arguments.memory_songs])
+        logging.info('Benchmarking the training')
+        # imported after the preprocessing, the spawned stage processes import this module and torch would
+        # otherwise dominate their memory
+        from benchmarks.training_benchmark import benchmark_training
+        training_results = benchmark_training(config.corpus_folder.joinpath('chords_index'), arguments.batch_size,
+                                              arguments.num_epochs, arguments.window_length, arguments.seed)
+    finally:
+        shutil.rmtree(data_folder)
+
+    results = {
+        'commit': get_commit(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'arguments': {name: str(value) if isinstance(value, Path) else value
+                      for name, value in vars(arguments).items()},
+        'preprocessing': preprocessing_results,
+        'pianoroll_memory': pianoroll_memory_results,
+        'training': training_results,
+    }
+    arguments.output_folder.mkdir(parents=True, exist_ok=True)
+    result_file = arguments.output_folder.joinpath(f'benchmark_{time.strftime("%Y%m%d_%H%M%S")}.json')
+    json.dump(results, open(result_file, 'w'), indent=1)
+    logging.info(f'Results written to {result_file}')
@@ -0,0 +1,34 @@
+import json
+import logging
+from pathlib import Path
+
+import torch
+
+from training.chord_lstm import settings
+from training.chord_lstm.chord_lstm import ChordLstm
+from training.chord_lstm.data_loader import ChordDataLoader
+from training.lstm_trainer import MODEL_FILE
+from generation.chord_generator import load_index_dict
+from generation.model_export import export_chord_lstm
+from benchmarks.chord_lstm_export_benchmark import benchmark_exported_chord_lstm
+
+logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.INFO)
+
+if __name__ == '__main__':
+    data_folder = Path('../data/2000_songs_data_set')
+    model_folder = Path('../models/2000_songs_data_set')
+    export_folder = model_folder.joinpath('export')
+
+    model = ChordLstm()
+    model.load_state_dict(torch.load(model_folder.joinpath(MODEL_FILE)))
+    index_to_chord = load_index_dict(data_folder.joinpath('8_chord_dicts', 'shifted_index_dict.pickle'))
+    for quantized in (False, True):
+        model_file = export_chord_lstm(model, index_to_chord, export_folder, quantized)
+        logging.info(f'Exported {model_file}')
+
+    # the same seed as the training gives the same test set
+    torch.manual_seed(settings.seed)
+    _, test_data = ChordDataLoader(data_folder.joinpath('10_corpora', 'chords_index')).get_chord_train_and_test_set()
+    results = benchmark_exported_chord_lstm(export_folder, test_data)
+    json.dump(results, open(export_folder.joinpath('benchmark.json'), 'w'), indent=1)
+    logging.info(json.dumps(results, indent=1))
@@ -0,0 +1,62 @@
+import logging
+from pathlib import Path
+from typing import Callable
+
+import torch
+
+from training.chord_lstm import settings
+from training.chord_lstm.chord_lstm import ChordLstm
+from training.chord_lstm.data_loader import ChordDataLoader
+from training.lstm_trainer import LstmTrainerConfig, LstmTrainer
+from training.hyperparameter_sweep import SweepConfig, get_grid_trials, get_random_trials, run_sweep
+
+logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.INFO)
+
+
+def make_trial_trainer(parameters: dict, chord_sequences: list, model_folder: Path, num_epochs: int,
+                       should_stop: Callable[[int, float], bool]) -> LstmTrainer:
+    # the parameters that are not swept keep their value of the chord lstm settings
+    training_data, test_data = ChordDataLoader.split_chord_sequences(chord_sequences)
+
+    model = ChordLstm(
+        chord_embedding_dim=parameters.get('chord_embedding_dim', settings.chord_embedding_dim),
+        hidden_layer_size=parameters.get('chord_lstm_hidden_layer_size', settings.chord_lstm_hidden_layer_size))
+
+    trainer_config = LstmTrainerConfig(
+        loss_fn=torch.nn.NLLLoss(),
+        optimizer=torch.optim.Adam(model.parameters(), lr=parameters.get('learning_rate', 1e-2)),
+        num_epochs=num_epochs,
+        model_folder=model_folder,
+        batch_size=parameters.get('batch_size', settings.batch_size),
+        window_length=settings.window_length,
+        window_stride=settings.window_stride,
+        seed=settings.seed,
+        step_metrics_interval=None,
+        resume=False,
+        early_stopping_patience=settings.early_stopping_patience,
+        should_stop=should_stop,
+    )
+
+    return LstmTrainer(model, training_data, test_data, trainer_config)
+
+
+def sweep_chord_lstm():
+    chord_index_folder = Path('../data/2000_songs_data_set/10_corpora/chords_index')
+    # the chord sequences are loaded once and shared by all trials
+    chord_sequences = ChordDataLoader(chord_index_folder).load_chord_sequences()
+    if settings.sweep_num_trials is None:
+        trials = get_grid_trials(settings.sweep_search_space)
+    else:
+        trials = get_random_trials(settings.sweep_search_space, settings.sweep_num_trials, settings.seed)
+    sweep_config = SweepConfig(
+        sweep_folder=Path('../models/2000_songs_data_set/sweep'),
+        num_workers=settings.sweep_num_workers,
+        num_epochs=settings.sweep_num_epochs,
+        seed=settings.seed,
+        pruning_warmup_epochs=settings.sweep_pruning_warmup_epochs,
+    )
+    run_sweep(make_trial_trainer, trials, chord_sequences, sweep_config)
+
+
+if __name__ == '__main__':
+    sweep_chord_lstm()
@@ -2,13 +2,15 @@ from pathlib import Path
 
 import torch
 
+from training.chord_lstm import settings
 from training.chord_lstm.chord_lstm import ChordLstm
+from training.distributed import train_distributed
 from training.lstm_trainer import LstmTrainerConfig, LstmTrainer
 from training.chord_lstm.data_loader import ChordDataLoader
 
-if __name__ == '__main__':
 
-    chord_index_folder = Path('../data/2000_songs_data_set/9_shifted_chords_index')
+def make_trainer() -> LstmTrainer:
+    chord_index_folder = Path('../data/2000_songs_data_set/10_corpora/chords_index')
     chord_data_loader = ChordDataLoader(chord_index_folder)
     training_data, test_data = chord_data_loader.get_chord_train_and_test_set()
 
@@ -18,9 +20,25 @@ if __name__ == '__main__':
         loss_fn=torch.nn.NLLLoss(),
         optimizer=torch.optim.Adam(model.parameters(), lr=1e-2),
         num_epochs=100,
-        model_folder=Path('../models/2000_songs_data_set')
+        model_folder=Path('../models/2000_songs_data_set'),
+        batch_size=settings.batch_size,
+        window_length=settings.window_length,
+        window_stride=settings.window_stride,
+        seed=settings.seed,
+        step_metrics_interval=settings.step_metrics_interval,
+        profiler_steps=settings.profiler_steps,
+        checkpoint_interval=settings.checkpoint_interval,
+        keep_last_checkpoints=settings.keep_last_checkpoints,
+        keep_best_checkpoints=settings.keep_best_checkpoints,
+        early_stopping_patience=settings.early_stopping_patience,
     )
 
-    trainer = LstmTrainer(model, training_data, test_data, trainer_config)
+    return LstmTrainer(model, training_data, test_data, trainer_config)
+
 
-    trainer.train()
+if __name__ == '__main__':
+    if settings.num_training_processes > 1:
+        train_distributed(make_trainer, settings.num_training_processes, settings.seed)
+    else:
+        torch.manual_seed(settings.seed)
+        make_trainer().train()
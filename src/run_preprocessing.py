@@ -1,18 +1,26 @@
+import os
 import logging
+import argparse
 from pathlib import Path
+from typing import Optional
 
 import settings
+from preprocessing import stage_graph
 from preprocessing.midi_data_preprocessor_config import MidiDataPreprocessorConfig
-from preprocessing.midi_data_processor import MidiDataPreprocessor
+
+# The midi, numpy and worker dependencies of the stages are only imported when a stage is run, listing the stages or
+# checking which of them are out of date starts without them.
 
 logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.DEBUG)
 
 
-def preprocess_midi_data():
-    data_folder = Path('../data/2000_songs_data_set')
+DATA_FOLDER = Path('../data/2000_songs_data_set')
+
 
-    midi_preprocesser_config = MidiDataPreprocessorConfig(
+def get_midi_preprocessor_config(data_folder: Path = DATA_FOLDER) -> MidiDataPreprocessorConfig:
+    return MidiDataPreprocessorConfig(
         source_folder=data_folder.joinpath('0_original'),
+        note_events_folder=data_folder.joinpath('0_note_events'),
         tempo_shift_folder=data_folder.joinpath('1_tempo_shifted_to_120bpm'),
         histogram_per_bar_folder=data_folder.joinpath('2_histogram_per_bar'),
         histogram_per_song_folder=data_folder.joinpath('3_histogram_per_song'),
@@ -26,37 +34,75 @@ def preprocess_midi_data():
         index_dict_name='shifted_index_dict.pickle',
 
         sampling_frequency=settings.sampling_frequency,
+        num_workers=os.cpu_count(),
+        manifest_folder=data_folder.joinpath('manifests'),
+        corpus_folder=data_folder.joinpath('10_corpora'),
+        report_folder=data_folder.joinpath('reports'),
+        tensorboard_report=settings.preprocessing_tensorboard_report,
+        profiled_stages=settings.profiled_preprocessing_stages,
     )
 
-    midi_preprocesser = MidiDataPreprocessor(midi_preprocesser_config)
 
-    logging.info('1. Shift the tempo of all the midi files to 120 bmp')
-    midi_preprocesser.save_tempo_shifted_midi_files()
+def get_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Preprocess the midi data set, all stages or a selection of them')
+    parser.add_argument('--data-folder', type=Path, default=DATA_FOLDER)
+    parser.add_argument('--num-workers', type=int, default=os.cpu_count())
+    pipeline = parser.add_mutually_exclusive_group()
+    pipeline.add_argument('--fused', dest='fused', action='store_true', default=settings.fused_preprocessing,
+                          help='fuse the steps 1 to 7 (default from settings.fused_preprocessing)')
+    pipeline.add_argument('--staged', dest='fused', action='store_false', help='run the steps 1 to 7 one by one')
+    parser.add_argument('--stage', help='run only this stage')
+    parser.add_argument('--from', dest='first_stage', help='run the stages from this stage on')
+    parser.add_argument('--to', dest='last_stage', help='run the stages up to this stage')
+    parser.add_argument('--out-of-date', action='store_true',
+                        help='run only the selected stages and the stages they depend on that are out of date')
+    parser.add_argument('--list', action='store_true', help='list the stages and whether they are out of date')
+    return parser.parse_args()
+
+
+def get_selected_stages(pipeline: tuple[stage_graph.Stage, ...], stage: Optional[str], first_stage: Optional[str],
+                        last_stage: Optional[str]) -> list[stage_graph.Stage]:
+    if stage is not None:
+        if first_stage is not None or last_stage is not None:
+            raise ValueError('--stage can not be combined with --from or --to')
+        return [stage_graph.get_stage(pipeline, stage)]
+    return stage_graph.get_stage_range(pipeline, first_stage, last_stage)
 
-    logging.info('2. Create a histogram of which notes are played for each bar of every song')
-    midi_preprocesser.save_note_histograms_per_bar()
 
-    logging.info('3. Create a histogram of which notes are played for each song')
-    midi_preprocesser.save_note_histograms_per_song()
+def list_stages(pipeline: tuple[stage_graph.Stage, ...], config: MidiDataPreprocessorConfig) -> None:
+    for index, stage in enumerate(pipeline):
+        status = 'out of date' if stage_graph.is_out_of_date(stage, config) else 'up to date'
+        print(f'{index:2d}. {stage.name:<40} {status:<12} {stage.description}')
 
-    logging.info('4. Shift all the notes of the midi files to the key of C major')
-    midi_preprocesser.save_shifted_midi_files()
 
-    logging.info('5. Create a pianoroll representation of tempo/key shifted midi files')
-    midi_preprocesser.save_note_index_from_pianorolls()
+def run_stages(stages: list[stage_graph.Stage], config: MidiDataPreprocessorConfig) -> None:
+    if not stages:
+        logging.info('All stages are up to date')
+        return
+    from preprocessing.midi_data_processor import MidiDataPreprocessor
+    midi_preprocesser = MidiDataPreprocessor(config)
+    for stage in stages:
+        logging.info(stage.description)
+        getattr(midi_preprocesser, stage.name)(*stage_graph.get_stage_arguments(stage))
 
-    logging.info('6. Create a histogram of which notes are played for each bar of every key shifted song')
-    midi_preprocesser.save_histo_oct_from_shifted_midi_folder()
 
-    logging.info('7. Extract a chord for each bar from histogram data')
-    midi_preprocesser.save_chords_from_histogram()
+def preprocess_midi_data(config: Optional[MidiDataPreprocessorConfig] = None) -> None:
+    # all stages of the staged pipeline
+    run_stages(list(stage_graph.STAGED_PIPELINE), config or get_midi_preprocessor_config())
 
-    logging.info('8. Make a chord dictionary that maps the 50 most used chords to an index')
-    midi_preprocesser.make_chord_dict(settings.num_chords)
 
-    logging.info('9. Create chord-index sequence for each song ')
-    midi_preprocesser.save_chord_index_sequence()
+def preprocess_midi_data_fused(config: Optional[MidiDataPreprocessorConfig] = None) -> None:
+    # all stages of the fused pipeline
+    run_stages(list(stage_graph.FUSED_PIPELINE), config or get_midi_preprocessor_config())
 
 
 if __name__ == '__main__':
-    preprocess_midi_data()
+    arguments = get_arguments()
+    config = get_midi_preprocessor_config(arguments.data_folder)
+    config.num_workers = arguments.num_workers
+    pipeline = stage_graph.get_pipeline(arguments.fused)
+    if arguments.list:
+        list_stages(pipeline, config)
+    else:
+        selected_stages = get_selected_stages(pipeline, arguments.stage, arguments.first_stage, arguments.last_stage)
+        run_stages(stage_graph.get_stages_to_run(pipeline, selected_stages, config, arguments.out_of_date), config)
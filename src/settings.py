@@ -1,3 +1,17 @@
+# parse every midi file once and run the preprocessing stages in memory
+fused_preprocessing = True
+# intermediate results the fused preprocessing writes anyway, e.g. ('key_shifted_folder',)
+fused_preprocessing_intermediates = ()
+
+# compute the histograms per bar from the note events instead of sampled pianorolls, the results only differ
+# for sustain pedals and pitch bends, which the pianorolls render and the events ignore
+event_based_histograms = False
+
+# names of the MidiDataPreprocessor stages to run under cProfile, e.g. ('save_songs_fused',)
+profiled_preprocessing_stages = ()
+# write the preprocessing report to tensorboard as well
+preprocessing_tensorboard_report = False
+
 over_sample_midi_files = True               # oversampling gives a better chord representation
 over_sample_factor = 2
 
@@ -0,0 +1,48 @@
+import math
+
+import pytest
+import torch
+
+import settings
+from generation.chord_generator import ChordGenerator
+from training.chord_lstm.chord_lstm import ChordLstm
+
+# the dictionary has fewer chords than the vocabulary of the second model, its indices 4 and 5 have no chord
+INDEX_TO_CHORD = {0: settings.unknown_chord_tag, 1: (0, 4, 7), 2: (2, 7, 11), 3: (0, 5, 9)}
+PREFIX = [(0, 4, 7), (0, 5, 9)]
+
+
+def get_generator(num_chords: int) -> ChordGenerator:
+    torch.manual_seed(num_chords)
+    return ChordGenerator(ChordLstm(num_chords, 4, 8), INDEX_TO_CHORD)
+
+
+@pytest.mark.parametrize('num_chords', (4, 6))
+@pytest.mark.parametrize('allow_unknown', (False, True))
+@pytest.mark.parametrize('beam_width', (1, 3, 4, 10))
+@pytest.mark.parametrize('length', (1, 3))
+def test_beam_search(num_chords, allow_unknown, beam_width, length):
+    beams = get_generator(num_chords).beam_search(PREFIX, length, beam_width, allow_unknown)
+    allowed_chords = [chord for chord in INDEX_TO_CHORD.values()
+                      if allow_unknown or chord != settings.unknown_chord_tag]
+    assert len(beams) == min(beam_width, len(allowed_chords) ** length)
+    assert all(len(beam) == length and set(beam) <= set(allowed_chords) for beam, _ in beams)
+    scores = [score for _, score in beams]
+    assert all(math.isfinite(score) for score in scores)
+    assert scores == sorted(scores, reverse=True)
+
+
+@pytest.mark.parametrize('num_chords', (4, 6))
+@pytest.mark.parametrize('top_k', (None, 1, 10))
+def test_sample(num_chords, top_k):
+    progressions = get_generator(num_chords).sample(PREFIX, 5, num_progressions=8, top_k=top_k,
+                                                    generator=torch.Generator().manual_seed(0))
+    assert len(progressions) == 8
+    assert all(len(progression) == 5 and settings.unknown_chord_tag not in progression
+               and set(progression) <= set(INDEX_TO_CHORD.values()) for progression in progressions)
+
+
+@pytest.mark.parametrize('arguments', ({'temperature': 0}, {'temperature': -1.0}, {'top_k': 0}))
+def test_sample_rejects_invalid_arguments(arguments):
+    with pytest.raises(ValueError):
+        get_generator(4).sample(PREFIX, 2, **arguments)
@@ -0,0 +1,65 @@
+import numpy as np
+import _pickle as pickle
+import pytest
+
+from utils import corpus, midi_functions
+
+
+def write_pickle_folder(pickle_folder, songs: dict) -> None:
+    pickle_folder.mkdir()
+    for song_name, song in songs.items():
+        pickle.dump(song, open(pickle_folder.joinpath(song_name + '.pickle'), 'wb'))
+
+
+def test_convert_pianoroll_folder_with_note_index_and_packed_notes(tmp_path):
+    # pianoroll files of earlier versions hold a tuple of note indices per time step
+    note_index = [(0, 60, 64), (), (127,), (60, 64, 67, 71)]
+    pianoroll = np.zeros((128, 3), dtype=bool)
+    pianoroll[[36, 48], 1] = True
+    write_pickle_folder(tmp_path.joinpath('pianorolls'), {
+        'a.mid': note_index,
+        'b.mid': midi_functions.pianoroll_to_packed_notes(pianoroll),
+        'c.mid': [],
+    })
+    corpus.convert_pickle_folder(tmp_path.joinpath('pianorolls'), tmp_path.joinpath('note_index'),
+                                 corpus.packed_notes_to_array, np.uint8, (128 // 8,))
+    note_corpus = corpus.Corpus(tmp_path.joinpath('note_index'))
+    assert note_corpus.song_names == ['a.mid', 'b.mid', 'c.mid']
+    assert corpus.array_to_note_index(note_corpus.get_song('a.mid')) == note_index
+    assert corpus.array_to_note_index(note_corpus.get_song('b.mid')) == [(), (36, 48), ()]
+    assert len(note_corpus.get_song('c.mid')) == 0
+
+
+def test_convert_chord_folder_with_chord_tuples_and_bitmasks(tmp_path):
+    # chord files of earlier versions hold a tuple of pitch classes per bar
+    chords = [(0, 4, 7), (), (2, 5, 9, 11), (0, 4, 7)]
+    write_pickle_folder(tmp_path.joinpath('chords'), {
+        'a.mid': chords,
+        'b.mid': np.array([midi_functions.chord_to_bitmask((5, 9, 0))], dtype=np.uint16),
+        'c.mid': [],
+    })
+    corpus.convert_pickle_folder(tmp_path.joinpath('chords'), tmp_path.joinpath('chords_corpus'),
+                                 corpus.chord_bitmasks_to_array, np.uint16)
+    chord_corpus = corpus.Corpus(tmp_path.joinpath('chords_corpus'))
+    assert [midi_functions.bitmask_to_chord(bitmask) for bitmask in chord_corpus.get_song('a.mid').tolist()] == chords
+    assert [midi_functions.bitmask_to_chord(bitmask) for bitmask in chord_corpus.get_song('b.mid').tolist()] == \
+        [(0, 5, 9)]
+    assert len(chord_corpus.get_song('c.mid')) == 0
+
+
+def test_failed_conversion_keeps_the_previous_corpus(tmp_path):
+    chords_index = {'a.mid': [1, 2, 3], 'b.mid': [4]}
+    write_pickle_folder(tmp_path.joinpath('chords_index'), chords_index)
+    corpus_folder = tmp_path.joinpath('chords_index_corpus')
+    corpus.convert_pickle_folder(tmp_path.joinpath('chords_index'), corpus_folder, corpus.chords_index_to_array,
+                                 np.int64)
+    # a song that can not be read stops the conversion before the other songs are written again
+    tmp_path.joinpath('chords_index', '0.mid.pickle').write_bytes(b'no pickle')
+    with pytest.raises(pickle.UnpicklingError):
+        corpus.convert_pickle_folder(tmp_path.joinpath('chords_index'), corpus_folder, corpus.chords_index_to_array,
+                                     np.int64)
+    assert sorted(file.name for file in corpus_folder.iterdir()) == \
+        [corpus.META_FILE, corpus.OFFSETS_FILE, corpus.VALUES_FILE]
+    chords_index_corpus = corpus.Corpus(corpus_folder)
+    assert chords_index_corpus.song_names == ['a.mid', 'b.mid']
+    assert [song.tolist() for song in chords_index_corpus] == list(chords_index.values())
@@ -0,0 +1,211 @@
+import numpy as np
+import pretty_midi as pm
+import pytest
+
+import settings
+from utils import corpus, midi_functions
+
+# The vectorized helpers of utils.midi_functions compared with the loop implementations they replaced, which are
+# kept here verbatim as reference.
+
+SEEDS = range(5)
+# 37 steps end with an incomplete bar, 0 steps is an empty song
+NUM_STEPS = (0, 1, 8, 37, 64)
+
+
+def reference_pianoroll_to_histogram_per_bar(pianoroll: np.ndarray, samples_per_bar: int) -> np.ndarray:
+    histogram_per_bar = np.zeros((pianoroll.shape[0], int(pianoroll.shape[1] / samples_per_bar)))
+    for i in range(0, pianoroll.shape[1] - samples_per_bar + 1, samples_per_bar):
+        histogram_per_bar[:, int(i / samples_per_bar)] = np.sum(pianoroll[:, i:i + samples_per_bar], axis=1)
+    return histogram_per_bar
+
+
+def reference_squash_octaves(histogram_per_bar: np.ndarray, semitones_in_octave: int) -> np.ndarray:
+    squashed_histogram = np.zeros((semitones_in_octave, histogram_per_bar.shape[1]))
+    for i in range(0, histogram_per_bar.shape[0] - semitones_in_octave + 1, semitones_in_octave):
+        squashed_histogram = np.add(squashed_histogram, histogram_per_bar[i:i + semitones_in_octave])
+    return squashed_histogram
+
+
+def reference_down_sample(pianoroll_double_sampled: np.ndarray, over_sample_factor: int) -> np.ndarray:
+    # the loop of the former over_sample
+    pianoroll = []
+    for i in range(0, pianoroll_double_sampled.shape[1], over_sample_factor):
+        vec = np.sum(pianoroll_double_sampled[:, i:(i + over_sample_factor)], axis=1)
+        pianoroll.append(vec)
+    pianoroll = np.array(pianoroll)
+    pianoroll = np.transpose(pianoroll)
+    return pianoroll
+
+
+def reference_binarize(pianoroll: np.ndarray) -> np.ndarray:
+    # the loop of the former get_pianoroll_of_pretty_midi
+    for i, _ in enumerate(pianoroll):
+        for j, _ in enumerate(pianoroll[i]):
+            if pianoroll[i, j] != 0:
+                pianoroll[i, j] = 1
+    return pianoroll
+
+
+def reference_pianoroll_to_note_index(pianoroll: np.ndarray) -> list[tuple]:
+    note_index = []
+    for i in range(0, pianoroll.shape[1]):
+        step = []
+        for j, note in enumerate(pianoroll[:, i]):
+            if note != 0:
+                step.append(j)
+        note_index.append(tuple(step))
+    return note_index
+
+
+def reference_bar_histogram_to_chords(histogram_per_bar: np.ndarray, notes_per_chord: int) -> list:
+    most_played_notes_per_bar = histogram_per_bar.argsort(axis=0)[-notes_per_chord:]
+    chords = []
+    for i in range(0, most_played_notes_per_bar.shape[1]):
+        chord = []
+        for note in most_played_notes_per_bar[:, i]:
+            if histogram_per_bar[note, i] != 0:
+                chord.append(note)
+        chord.sort()
+        chords.append(tuple(chord))
+    return chords
+
+
+def get_random_pianoroll(seed: int, num_steps: int, density: float = 0.1) -> np.ndarray:
+    # bool (128, steps) pianoroll, about half of the notes are never played and have all-zero rows
+    rng = np.random.default_rng(seed)
+    pianoroll = rng.random((128, num_steps)) < density
+    pianoroll[rng.random(128) < 0.5] = False
+    return pianoroll
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+@pytest.mark.parametrize('num_steps', NUM_STEPS)
+def test_pianoroll_to_histogram_per_bar(seed, num_steps):
+    pianoroll = get_random_pianoroll(seed, num_steps)
+    histogram = midi_functions.pianoroll_to_histogram_per_bar(pianoroll, 8)
+    np.testing.assert_array_equal(histogram, reference_pianoroll_to_histogram_per_bar(pianoroll.astype(float), 8))
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+@pytest.mark.parametrize('num_bars', (0, 1, 13))
+def test_squash_octaves(seed, num_bars):
+    # 128 notes end with an incomplete octave
+    histogram_per_bar = np.random.default_rng(seed).integers(0, 9, (128, num_bars)).astype(np.uint16)
+    histogram_per_bar[:40] = 0
+    squashed = midi_functions.squash_octaves(histogram_per_bar, 12)
+    np.testing.assert_array_equal(squashed, reference_squash_octaves(histogram_per_bar.astype(float), 12))
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+@pytest.mark.parametrize('num_steps', NUM_STEPS)
+def test_pianoroll_to_histo_oct(seed, num_steps):
+    pianoroll = get_random_pianoroll(seed, num_steps)
+    histogram = midi_functions.pianoroll_to_histo_oct(pianoroll, 8, 12)
+    reference = reference_squash_octaves(reference_pianoroll_to_histogram_per_bar(pianoroll.astype(float), 8), 12)
+    assert histogram.dtype == np.float64
+    np.testing.assert_array_equal(histogram, reference)
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+@pytest.mark.parametrize('num_steps', NUM_STEPS[1:])
+@pytest.mark.parametrize('factor', (1, 2, 3))
+def test_down_sample(seed, num_steps, factor):
+    velocities = np.random.default_rng(seed).integers(1, 128, (128, num_steps)) * get_random_pianoroll(seed, num_steps)
+    pianoroll = midi_functions.down_sample(velocities != 0, factor)
+    reference = reference_binarize(reference_down_sample(velocities.astype(float), factor))
+    np.testing.assert_array_equal(pianoroll, reference != 0)
+
+
+def test_down_sample_of_empty_song():
+    # the former loop collapsed an empty song to an array of shape (0,), it keeps its 128 notes now
+    pianoroll = midi_functions.down_sample(np.zeros((128, 0), dtype=bool), 2)
+    assert pianoroll.shape == (128, 0)
+    assert reference_down_sample(np.zeros((128, 0)), 2).size == 0
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+@pytest.mark.parametrize('num_steps', NUM_STEPS)
+def test_packed_notes_are_the_note_index(seed, num_steps):
+    pianoroll = get_random_pianoroll(seed, num_steps)
+    packed_notes = midi_functions.pianoroll_to_packed_notes(pianoroll)
+    assert packed_notes.shape == (num_steps, 128 // 8)
+    assert corpus.array_to_note_index(packed_notes) == reference_pianoroll_to_note_index(pianoroll.astype(float))
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+@pytest.mark.parametrize('notes_per_chord', (1, 3, 4))
+def test_bar_histogram_to_chords(seed, notes_per_chord):
+    # few distinct counts give many ties between the most played pitch classes, a bar without notes and a pitch
+    # class that is never played give all-zero columns and rows
+    histogram_per_bar = np.random.default_rng(seed).integers(0, 3, (12, 40)).astype(float)
+    histogram_per_bar[:, 5] = 0
+    histogram_per_bar[7] = 0
+    reference = reference_bar_histogram_to_chords(histogram_per_bar, notes_per_chord)
+    assert midi_functions.bar_histogram_to_chords(histogram_per_bar, notes_per_chord) == reference
+    chord_bitmasks = midi_functions.bar_histogram_to_chord_bitmasks(histogram_per_bar, notes_per_chord)
+    assert chord_bitmasks.dtype == np.uint16
+    assert [midi_functions.bitmask_to_chord(bitmask) for bitmask in chord_bitmasks.tolist()] == reference
+
+
+def test_bar_histogram_to_chords_without_bars():
+    histogram_per_bar = np.zeros((12, 0))
+    assert midi_functions.bar_histogram_to_chords(histogram_per_bar, 3) == []
+    assert reference_bar_histogram_to_chords(histogram_per_bar, 3) == []
+
+
+def get_song(with_pedal: bool, with_bends: bool, seed: int = 0) -> pm.PrettyMIDI:
+    rng = np.random.default_rng(int(with_pedal) + 2 * int(with_bends) + 4 * seed)
+    midi = pm.PrettyMIDI()
+    for program, is_drum in ((0, False), (33, False), (0, True)):
+        instrument = pm.Instrument(program, is_drum=is_drum)
+        for _ in range(60):
+            start = float(rng.uniform(0, 20))
+            instrument.notes.append(pm.Note(int(rng.integers(0, 128)), int(rng.integers(20, 128)), start,
+                                            start + float(rng.uniform(0.05, 2))))
+        if with_pedal:
+            for time in np.sort(rng.uniform(0, 22, 8)).tolist():
+                instrument.control_changes.append(pm.ControlChange(64, int(rng.integers(0, 128)), time))
+        if with_bends:
+            for time in np.sort(rng.uniform(0, 22, 6)).tolist():
+                instrument.pitch_bends.append(pm.PitchBend(int(rng.integers(-8192, 8192)), time))
+        midi.instruments.append(instrument)
+    # an instrument without notes does not count for the length of the pianoroll
+    midi.instruments.append(pm.Instrument(0))
+    return midi
+
+
+@pytest.mark.parametrize('with_pedal', (False, True))
+@pytest.mark.parametrize('with_bends', (False, True))
+@pytest.mark.parametrize('fs', (4, 8, 100))
+def test_get_played_notes(with_pedal, with_bends, fs):
+    midi = get_song(with_pedal, with_bends)
+    reference = reference_binarize(midi.get_piano_roll(fs=fs))
+    np.testing.assert_array_equal(midi_functions.get_played_notes(midi, fs), reference != 0)
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+@pytest.mark.parametrize('with_pedal', (False, True))
+@pytest.mark.parametrize('over_sample', (False, True))
+@pytest.mark.parametrize('fs', (4, 8))
+def test_pretty_midi_to_histo_oct(monkeypatch, seed, with_pedal, over_sample, fs):
+    # without sustain pedals and pitch bends the event based histograms equal the sampled ones, sustain pedals only
+    # lengthen the notes of the sampled pianorolls, the over sampled pianorolls are sampled at sampling_frequency
+    monkeypatch.setattr(settings, 'over_sample_midi_files', over_sample)
+    monkeypatch.setattr(settings, 'sampling_frequency', fs)
+    midi = get_song(with_pedal, with_bends=False, seed=seed)
+    histogram = midi_functions.pretty_midi_to_histo_oct(midi, 2 * fs, 12, fs)
+    sampled_histogram = midi_functions.pianoroll_to_histo_oct(
+        midi_functions.get_pianoroll_of_pretty_midi(midi, fs), 2 * fs, 12)
+    assert histogram.shape == sampled_histogram.shape
+    if with_pedal:
+        assert np.all(histogram <= sampled_histogram)
+    else:
+        np.testing.assert_array_equal(histogram, sampled_histogram)
+
+
+def test_get_played_notes_of_empty_song():
+    assert midi_functions.get_played_notes(pm.PrettyMIDI(), 4).shape == (128, 0)
+    midi = pm.PrettyMIDI()
+    midi.instruments.append(pm.Instrument(0))
+    assert midi_functions.get_played_notes(midi, 4).shape == midi.get_piano_roll(fs=4).shape
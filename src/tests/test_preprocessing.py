@@ -0,0 +1,54 @@
+import shutil
+
+import numpy as np
+import _pickle as pickle
+import pretty_midi as pm
+import pytest
+
+import settings
+from benchmarks.synthetic_midi_corpus import SyntheticCorpusConfig, generate_synthetic_corpus
+from preprocessing import stage_graph
+from run_preprocessing import get_midi_preprocessor_config, run_stages
+
+
+def run_pipeline(source_folder, data_folder, fused: bool):
+    shutil.copytree(source_folder, data_folder.joinpath('0_original'))
+    config = get_midi_preprocessor_config(data_folder)
+    config.num_workers = 1
+    config.manifest_folder = None
+    config.report_folder = None
+    run_stages(list(stage_graph.get_pipeline(fused)), config)
+    return config
+
+
+def add_sustain_pedals(midi_file) -> None:
+    # the sampled pianorolls lengthen the notes under a sustain pedal, the event based histograms do not
+    midi = pm.PrettyMIDI(str(midi_file))
+    rng = np.random.default_rng(len(midi_file.name))
+    for instrument in midi.instruments:
+        for time in np.sort(rng.uniform(0, midi.get_end_time(), 16)).tolist():
+            instrument.control_changes.append(pm.ControlChange(64, int(rng.choice((0, 127))), time))
+    midi.write(str(midi_file))
+
+
+def load_pickles(folder) -> dict:
+    return {file.name: pickle.load(open(file, 'rb')) for file in sorted(folder.glob('*.pickle'))}
+
+
+@pytest.mark.parametrize('event_based_histograms', (False, True))
+def test_fused_pipeline_equals_staged_pipeline(tmp_path, monkeypatch, event_based_histograms):
+    monkeypatch.setattr(settings, 'event_based_histograms', event_based_histograms)
+    source_folder = tmp_path.joinpath('midi')
+    for midi_file in generate_synthetic_corpus(
+            source_folder, SyntheticCorpusConfig(num_songs=4, bars_per_song=16, num_instruments=2)):
+        add_sustain_pedals(midi_file)
+    staged_config = run_pipeline(source_folder, tmp_path.joinpath('staged'), fused=False)
+    fused_config = run_pipeline(source_folder, tmp_path.joinpath('fused'), fused=True)
+    for folder in ('piano_roll_folder', 'chords_folder', 'chords_index_folder'):
+        staged_songs = load_pickles(getattr(staged_config, folder))
+        fused_songs = load_pickles(getattr(fused_config, folder))
+        assert len(staged_songs) == 4
+        assert staged_songs.keys() == fused_songs.keys()
+        for song_name, song in staged_songs.items():
+            np.testing.assert_array_equal(np.asarray(fused_songs[song_name]), np.asarray(song))
+    assert load_pickles(staged_config.dict_path) == load_pickles(fused_config.dict_path)
@@ -0,0 +1,98 @@
+import os
+import json
+from pathlib import Path
+from typing import Optional
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import torch
+
+# index of the checkpoints in the checkpoint folder with the epoch and test loss of every checkpoint
+INDEX_FILE = 'checkpoints.json'
+
+
+def clone_state(state):
+    # copies the tensors of a (nested) state dict, so the training can go on while the copy is written
+    if isinstance(state, torch.Tensor):
+        return state.detach().clone()
+    if isinstance(state, dict):
+        return {key: clone_state(value) for key, value in state.items()}
+    if isinstance(state, (list, tuple)):
+        return type(state)(clone_state(value) for value in state)
+    return state
+
+
+class CheckpointManager:
+    # Writes checkpoints of the training state in a background thread, one at a time, so the training loop only
+    # pays for copying the state. A checkpoint is written to a temporary file and renamed when it is complete,
+    # so a crash while writing never leaves a broken checkpoint behind.
+    # After every checkpoint only the keep_last latest and the keep_best checkpoints with the lowest test loss
+    # are kept.
+    def __init__(self, checkpoint_folder: Path, keep_last: int = 2, keep_best: int = 1):
+        self.checkpoint_folder = checkpoint_folder
+        self.keep_last = keep_last
+        self.keep_best = keep_best
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.pending_write: Optional[Future] = None
+
+    def save(self, epoch: int, state: dict, test_loss: float) -> None:
+        state = clone_state(state)
+        self.wait()
+        self.pending_write = self.executor.submit(self.__write, epoch, state, test_loss)
+
+    def wait(self) -> None:
+        # raises the error of the last write, if it failed
+        if self.pending_write is not None:
+            self.pending_write.result()
+            self.pending_write = None
+
+    def close(self) -> None:
+        self.wait()
+        self.executor.shutdown()
+
+    def load_latest(self) -> Optional[dict]:
+        checkpoints = self.__load_index()
+        if not checkpoints:
+            return None
+        latest = max(checkpoints, key=lambda checkpoint: checkpoint['epoch'])
+        return torch.load(self.checkpoint_folder.joinpath(latest['file']), weights_only=False)
+
+    def get_best_checkpoint(self) -> Optional[Path]:
+        checkpoints = self.__load_index()
+        if not checkpoints:
+            return None
+        best = min(checkpoints, key=lambda checkpoint: checkpoint['test_loss'])
+        return self.checkpoint_folder.joinpath(best['file'])
+
+    def __write(self, epoch: int, state: dict, test_loss: float) -> None:
+        self.checkpoint_folder.mkdir(parents=True, exist_ok=True)
+        checkpoint_file = f'checkpoint_epoch_{epoch:04d}.pt'
+        temporary_file = self.checkpoint_folder.joinpath(checkpoint_file + '.tmp')
+        torch.save(state, temporary_file)
+        os.replace(temporary_file, self.checkpoint_folder.joinpath(checkpoint_file))
+        checkpoints = [checkpoint for checkpoint in self.__load_index() if checkpoint['epoch'] != epoch]
+        checkpoints.append({'file': checkpoint_file, 'epoch': epoch, 'test_loss': test_loss})
+        self.__save_index(self.__remove_old_checkpoints(checkpoints))
+
+    def __remove_old_checkpoints(self, checkpoints: list[dict]) -> list[dict]:
+        latest = sorted(checkpoints, key=lambda checkpoint: checkpoint['epoch'], reverse=True)[:self.keep_last]
+        best = sorted(checkpoints, key=lambda checkpoint: checkpoint['test_loss'])[:self.keep_best]
+        kept_files = {checkpoint['file'] for checkpoint in latest + best}
+        for checkpoint in checkpoints:
+            if checkpoint['file'] not in kept_files:
+                self.checkpoint_folder.joinpath(checkpoint['file']).unlink(missing_ok=True)
+        return [checkpoint for checkpoint in checkpoints if checkpoint['file'] in kept_files]
+
+    def __load_index(self) -> list[dict]:
+        index_file = self.checkpoint_folder.joinpath(INDEX_FILE)
+        if not index_file.exists():
+            return []
+        checkpoints = json.load(open(index_file, 'r'))
+        return [checkpoint for checkpoint in checkpoints
+                if self.checkpoint_folder.joinpath(checkpoint['file']).exists()]
+
+    def __save_index(self, checkpoints: list[dict]) -> None:
+        # the index is replaced like the checkpoints, a crash leaves the previous index
+        index_file = self.checkpoint_folder.joinpath(INDEX_FILE)
+        with open(index_file.with_suffix('.tmp'), 'w') as temporary_index:
+            json.dump(sorted(checkpoints, key=lambda checkpoint: checkpoint['epoch']), temporary_index, indent=1)
+        os.replace(index_file.with_suffix('.tmp'), index_file)
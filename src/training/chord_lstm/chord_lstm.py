@@ -1,20 +1,77 @@
+import torch
 import torch.nn as nn
+from torch.nn.utils.rnn import pack_padded_sequence, pad_packed_sequence
 
 from training.chord_lstm import settings
 
 
 class ChordLstm(nn.Module):
-    def __init__(self):
+    def __init__(self, num_chords: int = settings.num_chords, chord_embedding_dim: int = settings.chord_embedding_dim,
+                 hidden_layer_size: int = settings.chord_lstm_hidden_layer_size):
         super(ChordLstm, self).__init__()
-        self.chord_embedding = nn.Embedding(settings.num_chords, settings.chord_embedding_dim)
-        self.lstm = nn.LSTM(settings.chord_embedding_dim, settings.chord_lstm_hidden_layer_size)
-        self.hidden_to_chord = nn.Linear(settings.chord_lstm_hidden_layer_size, settings.num_chords)
+        self.chord_embedding = nn.Embedding(num_chords, chord_embedding_dim)
+        self.lstm = nn.LSTM(chord_embedding_dim, hidden_layer_size)
+        self.hidden_to_chord = nn.Linear(hidden_layer_size, num_chords)
         self.log_softmax = nn.LogSoftmax(dim=1)
 
-    def forward(self, chord_sequence):
+    def forward(self, chord_sequence, lengths: torch.Tensor = None, hidden: tuple = None, carry_length: int = None):
+        # a single sequence (time) or a padded batch (time, batch) together with the length of every sequence,
+        # the scores of a batch are flattened to (time * batch, chords),
+        # with a hidden state the batch is a batch of windows, see forward_window
+        if hidden is not None:
+            return self.forward_window(chord_sequence, lengths, hidden, carry_length)
+        if lengths is None:
+            embeddings = self.chord_embedding(chord_sequence)
+            hidden, _ = self.lstm(embeddings.view(len(chord_sequence), 1, -1))
+            chord_space = self.hidden_to_chord(hidden.view(len(chord_sequence), -1))
+            chord_scores = self.log_softmax(chord_space)
+            return chord_scores
         embeddings = self.chord_embedding(chord_sequence)
-        hidden, _ = self.lstm(embeddings.view(len(chord_sequence), 1, -1))
-        chord_space = self.hidden_to_chord(hidden.view(len(chord_sequence), -1))
-        chord_scores = self.log_softmax(chord_space)
-        return chord_scores
+        packed_hidden, _ = self.lstm(pack_padded_sequence(embeddings, lengths, enforce_sorted=False))
+        hidden, _ = pad_packed_sequence(packed_hidden, total_length=chord_sequence.shape[0])
+        chord_space = self.hidden_to_chord(hidden.view(-1, hidden.shape[-1]))
+        return self.log_softmax(chord_space)
+
+    def forward_window(self, chord_windows, lengths: torch.Tensor, hidden: tuple, carry_length: int):
+        # a padded batch of windows (time, batch) that starts from the given hidden state, returns the scores and
+        # the hidden state after carry_length chords, which is where the next window of each song starts
+        embeddings = self.chord_embedding(chord_windows)
+        window_length = chord_windows.shape[0]
+        carry_lengths = lengths.clamp(max=carry_length)
+        packed_hidden, carried_hidden = self.lstm(
+            pack_padded_sequence(embeddings[:carry_length], carry_lengths, enforce_sorted=False), hidden)
+        hidden_states, _ = pad_packed_sequence(packed_hidden, total_length=min(carry_length, window_length))
+        if window_length > carry_length:
+            rest_hidden_states = hidden_states.new_zeros(
+                (window_length - carry_length, chord_windows.shape[1], hidden_states.shape[-1]))
+            has_rest = (lengths > carry_length).nonzero().squeeze(1)
+            if len(has_rest) > 0:
+                packed_rest, _ = self.lstm(pack_padded_sequence(
+                    embeddings[carry_length:, has_rest], lengths[has_rest] - carry_length, enforce_sorted=False),
+                    tuple(state[:, has_rest] for state in carried_hidden))
+                rest, _ = pad_packed_sequence(packed_rest, total_length=window_length - carry_length)
+                rest_hidden_states = rest_hidden_states.index_copy(1, has_rest, rest)
+            hidden_states = torch.cat([hidden_states, rest_hidden_states])
+        chord_space = self.hidden_to_chord(hidden_states.view(-1, hidden_states.shape[-1]))
+        return self.log_softmax(chord_space), carried_hidden
+
+    def forward_step(self, chords: torch.Tensor, hidden: tuple = None):
+        # a single time step for a batch of chords (batch), returns the scores of the next chords (batch, chords)
+        # and the hidden state to continue from, so generating a chord costs one step instead of the whole prefix
+        embeddings = self.chord_embedding(chords)
+        output, hidden = self.lstm(embeddings.view(1, len(chords), -1), hidden)
+        chord_space = self.hidden_to_chord(output.view(len(chords), -1))
+        return self.log_softmax(chord_space), hidden
+
+    def forward_prefix(self, chords: torch.Tensor, hidden: tuple = None):
+        # a whole sequence of chords (time) in one call, returns the scores of the chord after it (1, chords) and the
+        # hidden state after its last chord, so generating can continue with forward_step
+        embeddings = self.chord_embedding(chords)
+        output, hidden = self.lstm(embeddings.view(len(chords), 1, -1), hidden)
+        chord_space = self.hidden_to_chord(output[-1])
+        return self.log_softmax(chord_space), hidden
+
+    def get_initial_hidden(self, batch_size: int) -> tuple:
+        shape = (self.lstm.num_layers, batch_size, self.lstm.hidden_size)
+        return torch.zeros(shape), torch.zeros(shape)
 
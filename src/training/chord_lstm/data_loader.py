@@ -3,21 +3,30 @@ from pathlib import Path
 
 import torch
 
+from utils.corpus import Corpus
+
 
 class ChordDataLoader:
     def __init__(self, chords_index_folder: Path):
+        # either a chords index corpus or a folder with a pickle file per song
         self.chords_index_folder = chords_index_folder
 
     def get_chord_train_and_test_set(self):
-        chord_sequences = self.__load_chord_sequences()
-        data_set = self.__make_dataset(chord_sequences)
+        return self.split_chord_sequences(self.load_chord_sequences())
+
+    @classmethod
+    def split_chord_sequences(cls, chord_sequences: list) -> tuple:
+        # the split uses the global random number generator of torch
+        data_set = cls.__make_dataset(chord_sequences)
 
         train_set, test_set = torch.utils.data.random_split(data_set, [0.75, 0.25])
         return train_set, test_set
 
-    def __load_chord_sequences(self) -> list[list]:
+    def load_chord_sequences(self) -> list[list]:
+        if Corpus.exists(self.chords_index_folder):
+            return list(Corpus(self.chords_index_folder))
         data = []
-        for chords_song_file in self.chords_index_folder.rglob('*.pickle'):
+        for chords_song_file in sorted(self.chords_index_folder.rglob('*.pickle')):
             song = pickle.load(open(chords_song_file, 'rb'))
             data.append(song)
         return data
@@ -26,6 +35,9 @@ class ChordDataLoader:
     def __make_dataset(chord_sequences: list[list]) -> list[tuple]:
         dataset = []
         for chord_sequence in chord_sequences:
+            # songs shorter than two bars have nothing to predict
+            if len(chord_sequence) < 2:
+                continue
             chord_input = chord_sequence[:-1]
             chord_target = chord_sequence[1:]
             dataset.append((chord_input, chord_target))
@@ -5,3 +5,42 @@ chord_embedding_dim = 10
 chord_lstm_hidden_layer_size = 512
 
 num_chords = settings.num_chords
+
+# songs per training step, songs of similar length are batched together
+batch_size = 32
+
+# truncated backpropagation through time on windows of chords instead of whole songs, None trains on whole songs
+window_length = None
+# chords between the starts of two windows of a song, None uses window_length
+window_stride = None
+
+# processes for data parallel training on the cores of this machine, 1 trains in the calling process
+num_training_processes = 1
+# seed of the train/test split, the initial weights and the shuffling of the training data
+seed = 0
+
+# training steps over which the step metrics are averaged in tensorboard, None only writes the totals per epoch
+step_metrics_interval = 10
+# (first step, number of steps) to trace with torch.profiler, None does not profile
+profiler_steps = None
+
+# epochs between two checkpoints, the training resumes from the latest checkpoint when it is restarted
+checkpoint_interval = 5
+keep_last_checkpoints = 2
+keep_best_checkpoints = 1
+# epochs without improvement of the test loss after which the training stops, None trains for all epochs
+early_stopping_patience = 10
+
+# hyperparameter sweep of run_chord_lstm_sweep.py, every combination of the values is trained, with
+# sweep_num_trials the trials are sampled instead: a value of a list uniformly, a (low, high) tuple log uniformly
+sweep_search_space = {
+    'chord_embedding_dim': [8, 16, 32],
+    'chord_lstm_hidden_layer_size': [64, 128, 256],
+    'learning_rate': [1e-3, 3e-3, 1e-2],
+}
+sweep_num_trials = None
+# trials trained at the same time, every one in its own process with its share of the cores
+sweep_num_workers = 4
+sweep_num_epochs = 20
+# epochs before a trial whose test loss is worse than the median of the other trials is stopped
+sweep_pruning_warmup_epochs = 3
@@ -0,0 +1,48 @@
+import os
+import socket
+from typing import Callable
+
+import torch
+import torch.distributed as dist
+
+# Data parallel training on the cores of a single machine: every process trains a replica of the model on its
+# shard of the training set and the gradients are all-reduced with the gloo backend after every step.
+
+
+def train_distributed(make_trainer: Callable, num_processes: int, seed: int = 0) -> None:
+    # make_trainer is called in every process after the process group is set up and has to return an LstmTrainer,
+    # it has to be picklable (e.g. a module level function) and must not depend on random state other than torch
+    port = _get_free_port()
+    torch.multiprocessing.spawn(_train_process, args=(num_processes, port, make_trainer, seed), nprocs=num_processes)
+
+
+def _train_process(rank: int, num_processes: int, port: int, make_trainer: Callable, seed: int) -> None:
+    os.environ['MASTER_ADDR'] = '127.0.0.1'
+    os.environ['MASTER_PORT'] = str(port)
+    dist.init_process_group('gloo', rank=rank, world_size=num_processes)
+    # every process gets its share of the cores instead of all processes competing for all of them
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // num_processes))
+    # the same seed in every process gives the same train/test split and the same initial weights
+    torch.manual_seed(seed)
+    try:
+        make_trainer().train()
+    finally:
+        dist.destroy_process_group()
+
+
+def get_rank() -> int:
+    return dist.get_rank() if dist.is_initialized() else 0
+
+
+def get_world_size() -> int:
+    return dist.get_world_size() if dist.is_initialized() else 1
+
+
+def is_main_process() -> bool:
+    return get_rank() == 0
+
+
+def _get_free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as free_socket:
+        free_socket.bind(('127.0.0.1', 0))
+        return free_socket.getsockname()[1]
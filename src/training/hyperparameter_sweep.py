@@ -0,0 +1,177 @@
+import os
+import json
+import math
+import time
+import logging
+import itertools
+from pathlib import Path
+from typing import Callable, Optional
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import torch
+
+# Trains the trials of a hyperparameter sweep concurrently, every trial in a worker process of a pool.
+# The sequences of the data set are packed into one tensor in shared memory, which every worker maps instead of
+# loading its own copy. The test loss of every trial after every epoch is written to a shared table, a trial is
+# pruned when its test loss is worse than the median of the other trials after the same epoch.
+
+# summary of all trials in the sweep folder
+SUMMARY_FILE = 'sweep_summary.json'
+
+# state of a worker process, set once by the initializer of the pool
+_worker_state = dict()
+
+
+class SweepConfig:
+    def __init__(self, sweep_folder: Path, num_workers: int, num_epochs: int, seed: int = 0,
+                 threads_per_worker: Optional[int] = None, pruning_warmup_epochs: int = 2,
+                 pruning_min_trials: int = 3):
+        # every trial writes its model and tensorboard logs to sweep_folder/trial_<index>
+        self.sweep_folder = sweep_folder
+        # trials that are trained at the same time
+        self.num_workers = num_workers
+        self.num_epochs = num_epochs
+        # seed of the train/test split and the initial weights, the same for every trial
+        self.seed = seed
+        # torch threads of every worker, None shares the cores of the machine between the workers
+        self.threads_per_worker = threads_per_worker
+        # epochs before a trial can be pruned and the number of other trials that have to have reached the same
+        # epoch, None never prunes
+        self.pruning_warmup_epochs = pruning_warmup_epochs
+        self.pruning_min_trials = pruning_min_trials
+
+
+def get_grid_trials(search_space: dict[str, list]) -> list[dict]:
+    # every combination of the values of the parameters
+    names = list(search_space)
+    return [dict(zip(names, values)) for values in itertools.product(*(search_space[name] for name in names))]
+
+
+def get_random_trials(search_space: dict[str, object], num_trials: int, seed: int = 0) -> list[dict]:
+    # a list of values is sampled uniformly, a (low, high) tuple log uniformly, e.g. for learning rates
+    rng = np.random.default_rng(seed)
+    trials = []
+    for _ in range(num_trials):
+        parameters = dict()
+        for name, values in search_space.items():
+            if isinstance(values, tuple):
+                low, high = values
+                parameters[name] = float(math.exp(rng.uniform(math.log(low), math.log(high))))
+            else:
+                parameters[name] = values[int(rng.integers(len(values)))]
+        trials.append(parameters)
+    return trials
+
+
+def run_sweep(make_trainer: Callable, trials: list[dict], sequences: list, config: SweepConfig) -> list[dict]:
+    # make_trainer(parameters, sequences, model_folder, num_epochs, should_stop) is called in the worker of a trial
+    # and has to return an LstmTrainer whose config uses num_epochs and should_stop, it has to be picklable
+    # (e.g. a module level function)
+    lengths = [len(sequence) for sequence in sequences]
+    offsets = np.concatenate(([0], np.cumsum(lengths, dtype=np.int64)))
+    values = torch.from_numpy(np.concatenate([np.asarray(sequence, dtype=np.int64) for sequence in sequences])
+                              if sequences else np.zeros(0, dtype=np.int64)).share_memory_()
+    test_losses = torch.full((len(trials), config.num_epochs), math.nan, dtype=torch.float64).share_memory_()
+    threads_per_worker = config.threads_per_worker or max(1, (os.cpu_count() or 1) // config.num_workers)
+    config.sweep_folder.mkdir(parents=True, exist_ok=True)
+    logging.info(f'Training {len(trials)} trials in {config.num_workers} workers with {threads_per_worker} threads')
+    context = torch.multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=config.num_workers, mp_context=context, initializer=_init_worker,
+                             initargs=(values, offsets, test_losses, threads_per_worker)) as executor:
+        futures = [executor.submit(_run_trial, make_trainer, trial_index, parameters, config)
+                   for trial_index, parameters in enumerate(trials)]
+        results = []
+        for future in futures:
+            results.append(future.result())
+            logging.info(_format_result(results[-1]))
+    save_summary(results, config.sweep_folder)
+    logging.info('Sweep summary\n' + format_summary_table(results))
+    return results
+
+
+def save_summary(results: list[dict], sweep_folder: Path) -> None:
+    json.dump(sorted(results, key=_get_best_test_loss), open(sweep_folder.joinpath(SUMMARY_FILE), 'w'), indent=1)
+
+
+def format_summary_table(results: list[dict]) -> str:
+    # a row per trial sorted by the best test loss
+    names = sorted({name for result in results for name in result['parameters']})
+    header = ['trial'] + names + ['epochs', 'best_test_loss', 'training_loss', 'status', 'seconds']
+    rows = [header]
+    for result in sorted(results, key=_get_best_test_loss):
+        rows.append([str(result['trial'])] + [_format_value(result['parameters'].get(name)) for name in names] + [
+            str(result['epochs']), _format_value(result['best_test_loss']), _format_value(result['training_loss']),
+            result['status'], f'{result["seconds"]:.1f}'])
+    widths = [max(len(row[column]) for row in rows) for column in range(len(header))]
+    return '\n'.join('  '.join(value.rjust(width) for value, width in zip(row, widths)) for row in rows)
+
+
+def _init_worker(values: torch.Tensor, offsets: np.ndarray, test_losses: torch.Tensor,
+                 threads_per_worker: int) -> None:
+    # the workers together use the cores of the machine once instead of each of them all cores
+    torch.set_num_threads(threads_per_worker)
+    torch.set_num_interop_threads(1)
+    shared_values = values.numpy()
+    _worker_state['sequences'] = [shared_values[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+    _worker_state['test_losses'] = test_losses
+
+
+def _run_trial(make_trainer: Callable, trial_index: int, parameters: dict, config: SweepConfig) -> dict:
+    start_seconds = time.perf_counter()
+    test_losses = _worker_state['test_losses']
+    pruned_epochs = []
+
+    def should_stop(epoch: int, test_loss: float) -> bool:
+        test_losses[trial_index, epoch] = test_loss
+        if _should_prune(test_losses, trial_index, epoch, config):
+            pruned_epochs.append(epoch)
+            return True
+        return False
+
+    torch.manual_seed(config.seed)
+    model_folder = config.sweep_folder.joinpath(f'trial_{trial_index:03d}')
+    trainer = make_trainer(parameters, _worker_state['sequences'], model_folder, config.num_epochs, should_stop)
+    trainer.train()
+    if pruned_epochs:
+        status = 'pruned'
+    elif len(trainer.test_loss) < config.num_epochs:
+        status = 'stopped early'
+    else:
+        status = 'completed'
+    return {
+        'trial': trial_index,
+        'parameters': parameters,
+        'epochs': len(trainer.test_loss),
+        'best_test_loss': min(trainer.test_loss, default=math.nan),
+        'training_loss': trainer.training_loss[-1] if trainer.training_loss else math.nan,
+        'test_loss': trainer.test_loss,
+        'status': status,
+        'seconds': time.perf_counter() - start_seconds,
+    }
+
+
+def _should_prune(test_losses: torch.Tensor, trial_index: int, epoch: int, config: SweepConfig) -> bool:
+    # median pruning, trials that did not reach the epoch yet are not compared
+    if config.pruning_warmup_epochs is None or epoch < config.pruning_warmup_epochs:
+        return False
+    other_losses = torch.cat([test_losses[:trial_index, epoch], test_losses[trial_index + 1:, epoch]])
+    other_losses = other_losses[~torch.isnan(other_losses)]
+    if len(other_losses) < config.pruning_min_trials:
+        return False
+    return test_losses[trial_index, epoch].item() > other_losses.median().item()
+
+
+def _get_best_test_loss(result: dict) -> float:
+    return math.inf if math.isnan(result['best_test_loss']) else result['best_test_loss']
+
+
+def _format_value(value) -> str:
+    if isinstance(value, float):
+        return f'{value:.4g}'
+    return str(value)
+
+
+def _format_result(result: dict) -> str:
+    return f'Trial {result["trial"]} {result["status"]} after {result["epochs"]} epochs, ' \
+           f'best test loss {_format_value(result["best_test_loss"])}'
@@ -1,66 +1,294 @@
+import logging
 from pathlib import Path
+from typing import Callable, Optional
 
+import contextlib
 import torch
+from torch.nn.parallel import DistributedDataParallel
+from torch.distributed.algorithms.join import Join
 from torch.utils.tensorboard import SummaryWriter
 
+from training import distributed
+from training.step_metrics import StepMetrics
+from training.checkpointing import CheckpointManager
+from training.sequence_batching import PADDING_TARGET, TruncatedBpttLoader, get_batched_data_loader
+
+
+# state dict of the trained model in the model folder
+MODEL_FILE = 'model.pt'
+# folder of the training checkpoints in the model folder
+CHECKPOINT_FOLDER = 'checkpoints'
+
 
 class LstmTrainerConfig:
-    def __init__(self, loss_fn, optimizer, num_epochs, model_folder: Path):
+    def __init__(self, loss_fn, optimizer, num_epochs, model_folder: Path, batch_size: int = 1,
+                 window_length: Optional[int] = None, window_stride: Optional[int] = None, seed: Optional[int] = None,
+                 step_metrics_interval: Optional[int] = 1, profiler_steps: Optional[tuple[int, int]] = None,
+                 checkpoint_interval: Optional[int] = None, keep_last_checkpoints: int = 2,
+                 keep_best_checkpoints: int = 1, resume: bool = True, early_stopping_patience: Optional[int] = None,
+                 early_stopping_min_delta: float = 0., should_stop: Optional[Callable[[int, float], bool]] = None):
+        # the loss function has to ignore the padded targets, which is the default of torch.nn.NLLLoss
         self.loss_fn = loss_fn
         self.optimizer = optimizer
         self.num_epochs = num_epochs
         self.model_folder = model_folder
+        self.batch_size = batch_size
+        # trains on windows of window_length chords with truncated backpropagation through time instead of
+        # whole songs, the hidden state is carried over to the next window of a song which starts window_stride
+        # chords later (default window_length), the model has to implement forward_window and get_initial_hidden
+        self.window_length = window_length
+        self.window_stride = window_stride
+        # seed of the shuffling of the training data, None uses the global random number generator of torch,
+        # has to be set for distributed training
+        self.seed = seed
+        # steps over which the phase times, chords per second and peak memory are averaged before they are
+        # written to tensorboard, None only writes the totals per epoch
+        self.step_metrics_interval = step_metrics_interval
+        # (first step, number of steps) traced with torch.profiler after one warmup step, the trace is written
+        # to model_folder/tensorboard, None does not profile
+        self.profiler_steps = profiler_steps
+        # epochs between two checkpoints of the model, optimizer, random number generators and loss history in
+        # model_folder/checkpoints, None does not write checkpoints
+        self.checkpoint_interval = checkpoint_interval
+        # the latest and the best (lowest test loss) checkpoints that are kept, older ones are deleted
+        self.keep_last_checkpoints = keep_last_checkpoints
+        self.keep_best_checkpoints = keep_best_checkpoints
+        # continue the training from the latest checkpoint in the model folder if there is one
+        self.resume = resume
+        # stop when the test loss did not improve by more than early_stopping_min_delta on the best test loss
+        # for early_stopping_patience epochs, None trains for num_epochs
+        self.early_stopping_patience = early_stopping_patience
+        self.early_stopping_min_delta = early_stopping_min_delta
+        # called after every epoch with the epoch and its test loss, the training stops without a checkpoint when
+        # it returns True, e.g. when a hyperparameter sweep prunes the trial
+        self.should_stop = should_stop
 
 
 class LstmTrainer:
+    # Inside a torch.distributed process group (see training.distributed) the model is wrapped in
+    # DistributedDataParallel, every process trains on its shard of the training and test data,
+    # the losses are averaged over all processes and only the first process writes to tensorboard.
     def __init__(self, model: torch.nn.Module, training_data, test_data, config: LstmTrainerConfig):
         self._config = config
-        self.model = model
+        self.module = model
+        self.model = DistributedDataParallel(model) if distributed.get_world_size() > 1 else model
         self.training_data = training_data
         self.test_data = test_data
+        shard = {'num_replicas': distributed.get_world_size(), 'rank': distributed.get_rank()}
+        if config.window_length is None:
+            self.training_loader = get_batched_data_loader(
+                training_data, config.batch_size, shuffle=True, seed=config.seed, **shard)
+        else:
+            self.training_loader = TruncatedBpttLoader(training_data, config.batch_size, config.window_length,
+                                                       config.window_stride, shuffle=True, seed=config.seed, **shard)
+        self.test_loader = get_batched_data_loader(test_data, config.batch_size, shuffle=False, **shard)
         self.tensorboard_writer = self.__get_tensorboard_writer()
+        self.step_metrics = StepMetrics(self.tensorboard_writer, config.step_metrics_interval)
+        self.profiler = None
+        self.checkpoint_manager = CheckpointManager(config.model_folder.joinpath(CHECKPOINT_FOLDER),
+                                                    config.keep_last_checkpoints, config.keep_best_checkpoints)
         self.training_loss = []
         self.test_loss = []
+        self.epoch_metrics = []
 
     def train(self) -> None:
-        for epoch in range(self._config.num_epochs):
-            train_loss = self.__train_one_epoch()
-            self.tensorboard_writer.add_scalar('training_loss', train_loss, epoch)
-            self.training_loss.append(train_loss)
+        # every process resumes from the same checkpoint, only the first process writes checkpoints
+        first_epoch = self.__resume() if self._config.resume else 0
+        try:
+            with self.__get_profiler() as self.profiler:
+                for epoch in range(first_epoch, self._config.num_epochs):
+                    train_loss = self.__train_one_epoch()
+                    self.__add_scalar('training_loss', train_loss, epoch)
+                    self.training_loss.append(train_loss)
+                    self.epoch_metrics.append(self.step_metrics.end_epoch(epoch))
+
+                    test_loss = self.__get_test_loss()
+                    self.__add_scalar('test_loss', test_loss, epoch)
+                    self.test_loss.append(test_loss)
+
+                    stop_early = self.__should_stop_early()
+                    if self.__is_checkpoint_epoch(epoch, stop_early):
+                        self.save_checkpoint(epoch)
+                    if stop_early or self.__should_stop(epoch):
+                        break
+        finally:
+            self.profiler = None
+            self.checkpoint_manager.close()
+        self.save_model()
+
+    def save_checkpoint(self, epoch: int) -> None:
+        # the state is copied here and written in the background while the training continues
+        if distributed.is_main_process():
+            self.checkpoint_manager.save(epoch, self.__get_training_state(epoch), self.test_loss[-1])
+
+    def save_model(self) -> None:
+        if distributed.is_main_process():
+            self._config.model_folder.mkdir(parents=True, exist_ok=True)
+            torch.save(self.module.state_dict(), self._config.model_folder.joinpath(MODEL_FILE))
+
+    def __get_training_state(self, epoch: int) -> dict:
+        shuffle_generator = self.__get_shuffle_generator()
+        return {
+            'epoch': epoch,
+            'model': self.module.state_dict(),
+            'optimizer': self._config.optimizer.state_dict(),
+            'torch_rng_state': torch.get_rng_state(),
+            'shuffle_rng_state': None if shuffle_generator is None else shuffle_generator.get_state(),
+            'global_step': self.step_metrics.global_step,
+            'training_loss': self.training_loss,
+            'test_loss': self.test_loss,
+            'epoch_metrics': self.epoch_metrics,
+        }
+
+    def __resume(self) -> int:
+        # returns the first epoch that is not in the latest checkpoint, all processes load the optimizer state of
+        # the first process, with uneven shards the optimizer states of the processes differ in the steps a
+        # process has joined, so a resumed distributed run is equivalent but not bitwise identical
+        training_state = self.checkpoint_manager.load_latest()
+        if training_state is None:
+            return 0
+        self.module.load_state_dict(training_state['model'])
+        self._config.optimizer.load_state_dict(training_state['optimizer'])
+        torch.set_rng_state(training_state['torch_rng_state'])
+        shuffle_generator = self.__get_shuffle_generator()
+        if shuffle_generator is not None and training_state['shuffle_rng_state'] is not None:
+            shuffle_generator.set_state(training_state['shuffle_rng_state'])
+        self.step_metrics.global_step = training_state['global_step']
+        self.training_loss = training_state['training_loss']
+        self.test_loss = training_state['test_loss']
+        self.epoch_metrics = training_state['epoch_metrics']
+        logging.info(f'Resuming the training after epoch {training_state["epoch"]}')
+        return training_state['epoch'] + 1
+
+    def __get_shuffle_generator(self) -> Optional[torch.Generator]:
+        # the generator of the training data order, None if the global random number generator is used
+        if isinstance(self.training_loader, TruncatedBpttLoader):
+            return self.training_loader.generator
+        return self.training_loader.batch_sampler.generator
+
+    def __is_checkpoint_epoch(self, epoch: int, stop_early: bool) -> bool:
+        # the last epoch, also when the training stops early, is always checkpointed if checkpoints are written
+        interval = self._config.checkpoint_interval
+        return interval is not None and (
+            stop_early or (epoch + 1) % interval == 0 or epoch + 1 == self._config.num_epochs)
 
-            test_loss = self.__get_test_loss()
-            self.tensorboard_writer.add_scalar('test_loss', test_loss, epoch)
-            self.test_loss.append(test_loss)
+    def __should_stop_early(self) -> bool:
+        # the test loss is averaged over all processes, so they all stop in the same epoch
+        patience = self._config.early_stopping_patience
+        if patience is None or len(self.test_loss) <= patience:
+            return False
+        best_before = min(self.test_loss[:-patience])
+        return min(self.test_loss[-patience:]) > best_before - self._config.early_stopping_min_delta
+
+    def __should_stop(self, epoch: int) -> bool:
+        return self._config.should_stop is not None and self._config.should_stop(epoch, self.test_loss[-1])
 
     def __get_tensorboard_writer(self):
+        if not distributed.is_main_process():
+            return None
         tensorboard_path = self._config.model_folder.joinpath('tensorboard')
         return SummaryWriter(str(tensorboard_path))
 
+    def __get_profiler(self):
+        if self._config.profiler_steps is None or not distributed.is_main_process():
+            return contextlib.nullcontext()
+        first_step, num_steps = self._config.profiler_steps
+        trace_handler = torch.profiler.tensorboard_trace_handler(
+            str(self._config.model_folder.joinpath('tensorboard')))
+        return torch.profiler.profile(
+            schedule=torch.profiler.schedule(skip_first=first_step, wait=0, warmup=1, active=num_steps, repeat=1),
+            on_trace_ready=trace_handler, record_shapes=True, profile_memory=True)
+
+    def __end_step(self, num_chords: int) -> None:
+        self.step_metrics.end_step(num_chords)
+        if self.profiler is not None:
+            self.profiler.step()
+
+    def __add_scalar(self, tag: str, value: float, step: int) -> None:
+        if self.tensorboard_writer is not None:
+            self.tensorboard_writer.add_scalar(tag, value, step)
+
+    def __join_uneven_shards(self):
+        # the shards can have different numbers of batches, joining lets the processes that run out of batches
+        # shadow the gradient all-reduces of the others
+        if isinstance(self.model, DistributedDataParallel):
+            return Join([self.model])
+        return contextlib.nullcontext()
+
+    @staticmethod
+    def __get_mean_loss(loss_sum: float, num_chords: int) -> float:
+        if distributed.get_world_size() > 1:
+            totals = torch.tensor([loss_sum, num_chords], dtype=torch.float64)
+            torch.distributed.all_reduce(totals)
+            loss_sum, num_chords = totals.tolist()
+        return loss_sum / num_chords
+
     def __train_one_epoch(self) -> float:
+        if self._config.window_length is not None:
+            return self.__train_one_epoch_truncated_bptt()
         running_loss = 0.0
-        for input_sequence, target in self.training_data:
-            input_sequence = torch.tensor(input_sequence).view(len(input_sequence), 1, -1)
-            target = torch.tensor(target)
+        num_chords = 0
+        with self.__join_uneven_shards():
+            for input_sequences, targets, lengths in self.step_metrics.iterate(self.training_loader):
+                # Forward pass
+                with self.step_metrics.phase('forward'):
+                    output = self.model(input_sequences, lengths)
+                    loss = self._config.loss_fn(output, targets.view(-1))
 
-            # Forward pass
-            output = self.model(input_sequence)
-            loss = self._config.loss_fn(output, target)
+                # Backward pass
+                with self.step_metrics.phase('backward'):
+                    self._config.optimizer.zero_grad()
+                    loss.backward()
+                with self.step_metrics.phase('optimizer'):
+                    self._config.optimizer.step()
+                running_loss += loss.item() * self.__count_targets(targets)
+                num_chords += self.__count_targets(targets)
+                self.__end_step(self.__count_targets(targets))
 
-            # Backward pass
-            self._config.optimizer.zero_grad()
-            loss.backward()
-            self._config.optimizer.step()
-            running_loss += loss.item()
+        epoch_loss = self.__get_mean_loss(running_loss, num_chords)
+        return epoch_loss
+
+    def __train_one_epoch_truncated_bptt(self) -> float:
+        running_loss = 0.0
+        num_chords = 0
+        hidden = self.module.get_initial_hidden(self._config.batch_size)
+        carry_length = self.training_loader.stride
+        with self.__join_uneven_shards():
+            for input_windows, targets, lengths, streams, is_new_song in self.step_metrics.iterate(
+                    self.training_loader):
+                # Forward pass, the hidden state of the streams that start a new song is reset,
+                # the others continue their song
+                with self.step_metrics.phase('forward'):
+                    keep_hidden = (~is_new_song).float().view(1, -1, 1)
+                    stream_hidden = tuple(state[:, streams] * keep_hidden for state in hidden)
+                    output, carried_hidden = self.model(input_windows, lengths, stream_hidden, carry_length)
+                    loss = self._config.loss_fn(output, targets.view(-1))
 
-        epoch_loss = running_loss/len(self.training_data)
+                # Backward pass, the gradient is truncated at the window start
+                with self.step_metrics.phase('backward'):
+                    self._config.optimizer.zero_grad()
+                    loss.backward()
+                with self.step_metrics.phase('optimizer'):
+                    self._config.optimizer.step()
+                for state, carried_state in zip(hidden, carried_hidden):
+                    state[:, streams] = carried_state.detach()
+                running_loss += loss.item() * self.__count_targets(targets)
+                num_chords += self.__count_targets(targets)
+                self.__end_step(self.__count_targets(targets))
+
+        epoch_loss = self.__get_mean_loss(running_loss, num_chords)
         return epoch_loss
 
     def __get_test_loss(self) -> float:
         total_loss = 0
-        for input_sequence, target in self.test_data:
-            input_sequence = torch.tensor(input_sequence).view(len(input_sequence), 1, -1)
-            target = torch.tensor(target)
+        num_chords = 0
+        for input_sequences, targets, lengths in self.test_loader:
             with torch.no_grad():
-                output = self.model(input_sequence)
-                total_loss += self._config.loss_fn(output, target).item()
-        return total_loss / len(self.test_data)
+                output = self.module(input_sequences, lengths)
+                total_loss += self._config.loss_fn(output, targets.view(-1)).item() * self.__count_targets(targets)
+            num_chords += self.__count_targets(targets)
+        return self.__get_mean_loss(total_loss, num_chords)
+
+    @staticmethod
+    def __count_targets(targets: torch.Tensor) -> int:
+        return (targets != PADDING_TARGET).sum().item()
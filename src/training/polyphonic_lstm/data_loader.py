@@ -0,0 +1,146 @@
+from pathlib import Path
+from typing import Optional, Sequence
+
+import numpy as np
+import torch
+
+from training.polyphonic_lstm import settings
+from utils.corpus import Corpus
+
+PITCHES = 128
+PITCH_CLASSES = 12
+
+
+def transpose_note_frames(note_frames: np.ndarray, semitones: int) -> np.ndarray:
+    # shifts (steps, 128) note frames up by semitones, notes that are shifted out of the midi range are dropped
+    transposed = np.zeros_like(note_frames)
+    if semitones >= 0:
+        transposed[:, semitones:] = note_frames[:, :PITCHES - semitones]
+    else:
+        transposed[:, :semitones] = note_frames[:, -semitones:]
+    return transposed
+
+
+def transpose_chord_bitmasks(chord_bitmasks: np.ndarray, semitones: int) -> np.ndarray:
+    # rotates the pitch class bitmasks of utils.midi_functions by semitones
+    shift = semitones % PITCH_CLASSES
+    chord_bitmasks = chord_bitmasks.astype(np.int64)
+    return ((chord_bitmasks << shift) | (chord_bitmasks >> (PITCH_CLASSES - shift))) & ((1 << PITCH_CLASSES) - 1)
+
+
+class PolyphonicWindowDataset(torch.utils.data.Dataset):
+    # Windows of window_length note frames with their chord context, read from the memory mapped note_index and
+    # chords corpora of the preprocessing. Only the offsets of the songs are held in memory, every window is read
+    # from the mapped corpora when it is requested, so the memory does not grow with the corpus.
+    # A window is (note input, chord input, note target): the note input are the frames of window_length steps as
+    # (window_length, 128) floats, the note target the frames one step later. The chord input holds the chord
+    # indices of the bar of the target step and of the bar after it, index 0 (the unknown chord) after the last bar.
+    # Windows start every stride steps, the last window of a song ends with its last step, songs with fewer than
+    # window_length + 1 steps are left out. Every window is served once per transposition, notes and chords are
+    # transposed when the window is read, chords that are not in the dictionary then are mapped to the unknown chord.
+    def __init__(self, corpus_folder: Path, chord_index_table: np.ndarray,
+                 window_length: int = settings.window_length, stride: Optional[int] = settings.window_stride,
+                 transpositions: Sequence[int] = settings.transpositions,
+                 song_names: Optional[Sequence[str]] = None, samples_per_bar: int = settings.samples_per_bar):
+        self.corpus_folder = corpus_folder
+        self.chord_index_table = chord_index_table
+        self.window_length = window_length
+        self.stride = window_length if stride is None else stride
+        self.transpositions = tuple(transpositions)
+        self.samples_per_bar = samples_per_bar
+        if self.stride <= 0:
+            raise ValueError('The stride has to be positive')
+        # the corpora are opened on first access, so the dataset can be sent to data loader workers without them
+        self.note_corpus, self.chord_corpus = None, None
+        note_corpus, chord_corpus = self.__open_corpora()
+        self.song_names, self.note_songs, self.chord_songs, self.song_lengths = self.__align_songs(
+            note_corpus, chord_corpus, song_names)
+        num_windows = np.where(self.song_lengths > window_length,
+                               -(-(self.song_lengths - window_length - 1) // self.stride) + 1, 0)
+        # first window of every song and the end of the last song
+        self.window_offsets = np.concatenate(([0], np.cumsum(num_windows)))
+
+    def __len__(self) -> int:
+        return int(self.window_offsets[-1]) * len(self.transpositions)
+
+    def __getitem__(self, index: int) -> tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        if not 0 <= index < len(self):
+            raise IndexError(f'Window {index} of {len(self)}')
+        window_index, transposition_index = divmod(index, len(self.transpositions))
+        song = int(np.searchsorted(self.window_offsets, window_index, side='right')) - 1
+        start = min((window_index - int(self.window_offsets[song])) * self.stride,
+                    int(self.song_lengths[song]) - self.window_length - 1)
+        note_frames, chord_bitmasks = self.__read_window(song, start)
+        semitones = self.transpositions[transposition_index]
+        if semitones != 0:
+            note_frames = transpose_note_frames(note_frames, semitones)
+            chord_bitmasks = transpose_chord_bitmasks(chord_bitmasks, semitones)
+        chord_indices = np.append(self.chord_index_table[chord_bitmasks], 0)
+        target_bars = (start + 1 + np.arange(self.window_length)) // self.samples_per_bar
+        first_bar = start // self.samples_per_bar
+        chord_input = np.stack((chord_indices[target_bars - first_bar], chord_indices[target_bars - first_bar + 1]),
+                               axis=1)
+        note_frames = torch.from_numpy(note_frames.astype(np.float32))
+        return note_frames[:-1], torch.from_numpy(chord_input.astype(np.int64)), note_frames[1:]
+
+    def __getstate__(self) -> dict:
+        # mapped corpora are not sent to other processes, they are mapped again there
+        state = self.__dict__.copy()
+        state['note_corpus'], state['chord_corpus'] = None, None
+        return state
+
+    def get_num_windows(self) -> int:
+        # windows without the transpositions
+        return int(self.window_offsets[-1])
+
+    def __read_window(self, song: int, start: int) -> tuple[np.ndarray, np.ndarray]:
+        # the window_length + 1 note frames from start and the chords of their bars and of the bar after them
+        if self.note_corpus is None:
+            self.note_corpus, self.chord_corpus = self.__open_corpora()
+        packed_notes = self.note_corpus[int(self.note_songs[song])][start:start + self.window_length + 1]
+        note_frames = np.unpackbits(packed_notes, axis=1, count=PITCHES)
+        first_bar = start // self.samples_per_bar
+        last_bar = (start + self.window_length) // self.samples_per_bar
+        chord_bitmasks = self.chord_corpus[int(self.chord_songs[song])][first_bar:last_bar + 2]
+        return note_frames, chord_bitmasks
+
+    def __open_corpora(self) -> tuple[Corpus, Corpus]:
+        return Corpus(self.corpus_folder.joinpath('note_index')), Corpus(self.corpus_folder.joinpath('chords'))
+
+    def __align_songs(self, note_corpus: Corpus, chord_corpus: Corpus,
+                      song_names: Optional[Sequence[str]]) -> tuple[list[str], np.ndarray, np.ndarray, np.ndarray]:
+        # songs that are in both corpora, the steps of a song are cut to its complete bars, which have a chord
+        chord_songs = {song_name: index for index, song_name in enumerate(chord_corpus.song_names)}
+        if song_names is not None:
+            chord_songs = {song_name: chord_songs[song_name] for song_name in song_names if song_name in chord_songs}
+        aligned_songs = [(song_name, note_index, chord_songs[song_name])
+                         for note_index, song_name in enumerate(note_corpus.song_names) if song_name in chord_songs]
+        names = [song_name for song_name, _, _ in aligned_songs]
+        note_songs = np.array([note_index for _, note_index, _ in aligned_songs], dtype=np.int64)
+        chord_song_indices = np.array([chord_index for _, _, chord_index in aligned_songs], dtype=np.int64)
+        num_steps = np.diff(note_corpus.offsets)[note_songs]
+        num_bars = np.diff(chord_corpus.offsets)[chord_song_indices]
+        return names, note_songs, chord_song_indices, np.minimum(num_steps, num_bars * self.samples_per_bar)
+
+
+class PolyphonicDataLoader:
+    def __init__(self, corpus_folder: Path, chord_index_table: np.ndarray):
+        # the corpus folder of the preprocessing with the note_index and chords corpora
+        self.corpus_folder = corpus_folder
+        self.chord_index_table = chord_index_table
+
+    def get_train_and_test_set(self, window_length: int = settings.window_length,
+                               stride: Optional[int] = settings.window_stride,
+                               transpositions: Sequence[int] = settings.transpositions, seed: int = settings.seed,
+                               test_fraction: float = 0.25) -> tuple[PolyphonicWindowDataset, PolyphonicWindowDataset]:
+        # the songs are split, so windows of the same song are never in both sets, the test set is not transposed
+        song_names = Corpus(self.corpus_folder.joinpath('note_index')).song_names
+        permutation = torch.randperm(len(song_names), generator=torch.Generator().manual_seed(seed)).tolist()
+        num_test_songs = int(len(song_names) * test_fraction)
+        test_songs = [song_names[i] for i in sorted(permutation[:num_test_songs])]
+        train_songs = [song_names[i] for i in sorted(permutation[num_test_songs:])]
+        train_set = PolyphonicWindowDataset(self.corpus_folder, self.chord_index_table, window_length, stride,
+                                            transpositions, train_songs)
+        test_set = PolyphonicWindowDataset(self.corpus_folder, self.chord_index_table, window_length, stride,
+                                           (0,), test_songs)
+        return train_set, test_set
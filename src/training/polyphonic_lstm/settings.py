@@ -0,0 +1,13 @@
+import settings
+
+# time steps of note frames per training window, 8 bars
+window_length = 8 * settings.samples_per_bar
+# time steps between the starts of two windows of a song, None uses window_length
+window_stride = None
+# semitones every window is transposed by on the fly, every transposition is a separate sample, (0,) does not transpose
+transpositions = (0,)
+
+samples_per_bar = settings.samples_per_bar
+
+# seed of the train/test split of the songs
+seed = 0
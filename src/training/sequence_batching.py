@@ -0,0 +1,120 @@
+from typing import Iterator, Optional
+
+import numpy as np
+import torch
+from torch.nn.utils.rnn import pad_sequence
+
+# targets of padded time steps, the default ignore_index of torch.nn.NLLLoss, so padding is masked out of the loss
+PADDING_TARGET = -100
+PADDING_INPUT = 0
+
+
+class LengthBucketBatchSampler(torch.utils.data.Sampler):
+    # Groups sequences of similar length into the same batch to limit the padding per batch.
+    # The sequences are shuffled, split into pools of pool_size batches, sorted by length within a pool and
+    # cut into batches, the order of the batches is shuffled again.
+    # With num_replicas > 1 every replica gets every num_replicas-th batch, starting with batch rank,
+    # the replicas have to use the same seed.
+    def __init__(self, lengths: list[int], batch_size: int, shuffle: bool = True, pool_size: int = 50,
+                 seed: Optional[int] = None, num_replicas: int = 1, rank: int = 0):
+        self.lengths = lengths
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.pool_size = pool_size
+        self.generator = get_generator(seed)
+        self.num_replicas = num_replicas
+        self.rank = rank
+
+    def __iter__(self) -> Iterator[list[int]]:
+        indices = list(range(len(self.lengths)))
+        if self.shuffle:
+            indices = torch.randperm(len(self.lengths), generator=self.generator).tolist()
+        batches = []
+        pool_length = self.batch_size * self.pool_size
+        for pool_start in range(0, len(indices), pool_length):
+            pool = sorted(indices[pool_start:pool_start + pool_length], key=lambda index: self.lengths[index])
+            batches += [pool[i:i + self.batch_size] for i in range(0, len(pool), self.batch_size)]
+        if self.shuffle:
+            batches = [batches[i] for i in torch.randperm(len(batches), generator=self.generator).tolist()]
+        return iter(batches[self.rank::self.num_replicas])
+
+    def __len__(self) -> int:
+        num_batches = (len(self.lengths) + self.batch_size - 1) // self.batch_size
+        return len(range(self.rank, num_batches, self.num_replicas))
+
+
+def collate_padded_sequences(batch: list[tuple]) -> tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+    # (input, target) pairs to time major (time, batch) tensors and the lengths of the sequences
+    inputs = [torch.from_numpy(np.array(chord_input, dtype=np.int64)) for chord_input, _ in batch]
+    targets = [torch.from_numpy(np.array(chord_target, dtype=np.int64)) for _, chord_target in batch]
+    lengths = torch.tensor([len(chord_input) for chord_input in inputs], dtype=torch.int64)
+    return pad_sequence(inputs, padding_value=PADDING_INPUT), pad_sequence(targets, padding_value=PADDING_TARGET),\
+        lengths
+
+
+def get_generator(seed: Optional[int]) -> Optional[torch.Generator]:
+    # None uses the global random number generator of torch
+    return None if seed is None else torch.Generator().manual_seed(seed)
+
+
+def get_batched_data_loader(data_set, batch_size: int, shuffle: bool, seed: Optional[int] = None,
+                            num_replicas: int = 1, rank: int = 0) -> torch.utils.data.DataLoader:
+    lengths = [len(data_set[i][0]) for i in range(len(data_set))]
+    batch_sampler = LengthBucketBatchSampler(lengths, batch_size, shuffle, seed=seed, num_replicas=num_replicas,
+                                             rank=rank)
+    return torch.utils.data.DataLoader(data_set, batch_sampler=batch_sampler, collate_fn=collate_padded_sequences)
+
+
+class TruncatedBpttLoader:
+    # Cuts the songs into windows of window_length chords that start every stride chords and serves them as
+    # batch_size parallel streams, so the hidden state at the end of the first stride chords of a window can be
+    # carried over to the next window of the same song. A stream continues with the next song when its song ends.
+    # Every batch is (inputs, targets, lengths, streams, is_new_song), streams are the indices of the streams
+    # in the batch and is_new_song marks the streams whose hidden state has to be reset.
+    # Targets that overlap with the previous window of the song are padded, so every target is counted once.
+    # With num_replicas > 1 every replica gets every num_replicas-th song, the replicas have to use the same seed.
+    def __init__(self, data_set, batch_size: int, window_length: int, stride: int = None, shuffle: bool = True,
+                 seed: Optional[int] = None, num_replicas: int = 1, rank: int = 0):
+        self.data_set = data_set
+        self.batch_size = batch_size
+        self.window_length = window_length
+        self.stride = window_length if stride is None else stride
+        self.shuffle = shuffle
+        self.generator = get_generator(seed)
+        self.num_replicas = num_replicas
+        self.rank = rank
+        if not 0 < self.stride <= self.window_length:
+            raise ValueError(f'The stride has to be between 1 and the window length {window_length}')
+
+    def __iter__(self) -> Iterator[tuple]:
+        song_indices = list(range(len(self.data_set)))
+        if self.shuffle:
+            song_indices = torch.randperm(len(self.data_set), generator=self.generator).tolist()
+        song_indices = iter(song_indices[self.rank::self.num_replicas])
+        # every stream is None or [song input, song target, position of the next window]
+        streams = [self.__get_next_song(song_indices) for _ in range(self.batch_size)]
+        while any(stream is not None for stream in streams):
+            active_streams = [i for i, stream in enumerate(streams) if stream is not None]
+            windows = [self.__get_window(*streams[i]) for i in active_streams]
+            is_new_song = torch.tensor([streams[i][2] == 0 for i in active_streams])
+            yield collate_padded_sequences(windows) + (torch.tensor(active_streams), is_new_song)
+            for i in active_streams:
+                chord_input, _, position = streams[i]
+                if position + self.window_length >= len(chord_input):
+                    streams[i] = self.__get_next_song(song_indices)
+                else:
+                    streams[i][2] = position + self.stride
+
+    def __get_next_song(self, song_indices: Iterator[int]):
+        song_index = next(song_indices, None)
+        if song_index is None:
+            return None
+        chord_input, chord_target = self.data_set[song_index]
+        return [chord_input, chord_target, 0]
+
+    def __get_window(self, chord_input, chord_target, position: int) -> tuple:
+        window_input = np.array(chord_input[position:position + self.window_length], dtype=np.int64)
+        window_target = np.array(chord_target[position:position + self.window_length], dtype=np.int64)
+        if position > 0:
+            window_target[:self.window_length - self.stride] = PADDING_TARGET
+        return window_input, window_target
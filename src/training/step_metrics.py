@@ -0,0 +1,78 @@
+import time
+import resource
+import contextlib
+from typing import Iterable, Iterator, Optional
+
+from torch.profiler import record_function
+
+# phases of a training step, data_wait is the time the training loop waits for the next batch of the loader
+PHASES = ('data_wait', 'forward', 'backward', 'optimizer')
+
+
+def get_peak_rss_megabytes() -> float:
+    # ru_maxrss is in kilobytes on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class StepMetrics:
+    # Times the phases of every training step and counts the trained chords. Every interval steps the mean times
+    # in milliseconds, the chords per second and the peak memory are written to tensorboard under step/,
+    # at the end of an epoch the totals of the epoch under epoch/.
+    # The phases are also marked with record_function, so they show up in torch.profiler traces.
+    def __init__(self, tensorboard_writer, interval: Optional[int] = 1):
+        self.tensorboard_writer = tensorboard_writer
+        self.interval = interval
+        self.global_step = 0
+        self.interval_seconds = dict.fromkeys(PHASES, 0.)
+        self.interval_chords = 0
+        self.interval_steps = 0
+        self.epoch_seconds = dict.fromkeys(PHASES, 0.)
+        self.epoch_chords = 0
+
+    def iterate(self, loader: Iterable) -> Iterator:
+        iterator = iter(loader)
+        while True:
+            with self.phase('data_wait'):
+                batch = next(iterator, None)
+            if batch is None:
+                return
+            yield batch
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        with record_function(name):
+            yield
+        seconds = time.perf_counter() - start
+        self.interval_seconds[name] += seconds
+        self.epoch_seconds[name] += seconds
+
+    def end_step(self, num_chords: int) -> None:
+        self.global_step += 1
+        self.interval_steps += 1
+        self.interval_chords += num_chords
+        self.epoch_chords += num_chords
+        if self.interval is not None and self.interval_steps == self.interval:
+            self.__write_scalars('step', self.interval_seconds, self.interval_chords, self.interval_steps,
+                                 self.global_step)
+            self.interval_seconds = dict.fromkeys(PHASES, 0.)
+            self.interval_chords = 0
+            self.interval_steps = 0
+
+    def end_epoch(self, epoch: int) -> dict:
+        # the wait for the last batch of the epoch is not part of a step
+        summary = self.__write_scalars('epoch', self.epoch_seconds, self.epoch_chords, 1, epoch)
+        self.epoch_seconds = dict.fromkeys(PHASES, 0.)
+        self.epoch_chords = 0
+        return summary
+
+    def __write_scalars(self, prefix: str, seconds: dict, num_chords: int, num_steps: int, step: int) -> dict:
+        total_seconds = sum(seconds.values())
+        scalars = {f'{phase}_ms': phase_seconds / num_steps * 1000 for phase, phase_seconds in seconds.items()}
+        scalars['chords_per_second'] = num_chords / total_seconds if total_seconds > 0 else 0.
+        scalars['data_wait_fraction'] = seconds['data_wait'] / total_seconds if total_seconds > 0 else 0.
+        scalars['peak_rss_mb'] = get_peak_rss_megabytes()
+        if self.tensorboard_writer is not None:
+            for name, value in scalars.items():
+                self.tensorboard_writer.add_scalar(f'{prefix}/{name}', value, step)
+        return scalars
@@ -0,0 +1,146 @@
+import os
+import json
+from pathlib import Path
+from typing import Callable, Iterator
+
+import numpy as np
+import _pickle as pickle
+
+# A corpus stores the songs of one preprocessing stage in a folder with three files:
+#   values.bin   the rows of all songs concatenated along the first axis, raw and memory mappable
+#   offsets.npy  the first row of every song and the end of the last song
+#   meta.json    dtype, shape of a row and names of the songs
+# Reading a corpus maps the values instead of loading them and never executes pickle code.
+# The files are written under a temporary name and replaced when the corpus is complete, meta.json last, so a
+# killed run leaves the previous corpus or none, but never a meta.json that does not match the values.
+VALUES_FILE = 'values.bin'
+OFFSETS_FILE = 'offsets.npy'
+META_FILE = 'meta.json'
+
+
+class CorpusWriter:
+    def __init__(self, corpus_folder: Path, dtype, row_shape: tuple = ()):
+        self.corpus_folder = corpus_folder
+        self.dtype = np.dtype(dtype)
+        self.row_shape = tuple(row_shape)
+        self.song_names = []
+        self.offsets = [0]
+        self.corpus_folder.mkdir(parents=True, exist_ok=True)
+        self.values_file = open(self.__get_temporary_file(VALUES_FILE), 'wb')
+
+    def add(self, song_name: str, song: np.ndarray) -> None:
+        song = np.ascontiguousarray(song, dtype=self.dtype).reshape((-1,) + self.row_shape)
+        self.values_file.write(song.tobytes())
+        self.song_names.append(song_name)
+        self.offsets.append(self.offsets[-1] + song.shape[0])
+
+    def close(self) -> None:
+        self.values_file.close()
+        with open(self.__get_temporary_file(OFFSETS_FILE), 'wb') as offsets_file:
+            np.save(offsets_file, np.array(self.offsets, dtype=np.int64))
+        meta = {'dtype': self.dtype.str, 'row_shape': list(self.row_shape), 'song_names': self.song_names}
+        with open(self.__get_temporary_file(META_FILE), 'w') as meta_file:
+            json.dump(meta, meta_file)
+        self.corpus_folder.joinpath(META_FILE).unlink(missing_ok=True)
+        for file_name in (VALUES_FILE, OFFSETS_FILE, META_FILE):
+            os.replace(self.__get_temporary_file(file_name), self.corpus_folder.joinpath(file_name))
+
+    def discard(self) -> None:
+        # the corpus that was written before is kept
+        self.values_file.close()
+        self.__get_temporary_file(VALUES_FILE).unlink(missing_ok=True)
+
+    def __get_temporary_file(self, file_name: str) -> Path:
+        return self.corpus_folder.joinpath(file_name + '.tmp')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, *args):
+        if exception_type is None:
+            self.close()
+        else:
+            self.discard()
+
+
+class Corpus:
+    def __init__(self, corpus_folder: Path):
+        self.corpus_folder = corpus_folder
+        meta = json.load(open(corpus_folder.joinpath(META_FILE), 'r'))
+        self.song_names = meta['song_names']
+        self.offsets = np.load(corpus_folder.joinpath(OFFSETS_FILE), allow_pickle=False)
+        shape = (int(self.offsets[-1]),) + tuple(meta['row_shape'])
+        if shape[0] == 0:
+            self.values = np.zeros(shape, dtype=np.dtype(meta['dtype']))
+        else:
+            self.values = np.memmap(corpus_folder.joinpath(VALUES_FILE), dtype=np.dtype(meta['dtype']), mode='r',
+                                    shape=shape)
+
+    @staticmethod
+    def exists(corpus_folder: Path) -> bool:
+        return corpus_folder.joinpath(META_FILE).exists()
+
+    def __len__(self) -> int:
+        return len(self.song_names)
+
+    def __getitem__(self, song_index: int) -> np.ndarray:
+        # a view into the mapped values, no data is copied
+        return self.values[self.offsets[song_index]:self.offsets[song_index + 1]]
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        for song_index in range(len(self)):
+            yield self[song_index]
+
+    def get_song(self, song_name: str) -> np.ndarray:
+        return self[self.song_names.index(song_name)]
+
+
+def chords_index_to_array(chords_index: list) -> np.ndarray:
+    return np.array(chords_index, dtype=np.int64)
+
+
+def chord_bitmasks_to_array(chord_bitmasks: np.ndarray) -> np.ndarray:
+    # a pitch class bitmask per bar, see utils.midi_functions, chord files of earlier versions hold a list of
+    # pitch class tuples instead and are converted here
+    if isinstance(chord_bitmasks, list):
+        return chords_to_array(chord_bitmasks)
+    return np.asarray(chord_bitmasks, dtype=np.uint16)
+
+
+def chords_to_array(chords: list[tuple]) -> np.ndarray:
+    # the pitch classes of every bar, the chord format before the bitmasks
+    bitmasks = np.zeros(len(chords), dtype=np.uint16)
+    for i, chord in enumerate(chords):
+        for note in chord:
+            bitmasks[i] |= 1 << int(note)
+    return bitmasks
+
+
+def packed_notes_to_array(packed_notes: np.ndarray) -> np.ndarray:
+    # every time step is stored as 128 bits, one per midi note, see utils.midi_functions, pianoroll files of
+    # earlier versions hold a list of note index tuples instead and are packed here
+    if isinstance(packed_notes, list):
+        return note_index_to_array(packed_notes)
+    return np.asarray(packed_notes, dtype=np.uint8).reshape(-1, 128 // 8)
+
+
+def note_index_to_array(note_index: list[tuple]) -> np.ndarray:
+    # the notes played at every time step, the pianoroll format before the packed notes
+    pianoroll = np.zeros((len(note_index), 128), dtype=bool)
+    steps = np.repeat(np.arange(len(note_index)), [len(step) for step in note_index])
+    pianoroll[steps, [note for step in note_index for note in step]] = True
+    return np.packbits(pianoroll, axis=1)
+
+
+def array_to_note_index(array: np.ndarray) -> list[tuple]:
+    pianoroll = np.unpackbits(array, axis=1, count=128)
+    return [tuple(np.flatnonzero(step).tolist()) for step in pianoroll]
+
+
+def convert_pickle_folder(pickle_folder: Path, corpus_folder: Path, to_array: Callable[[object], np.ndarray],
+                          dtype, row_shape: tuple = ()) -> None:
+    # converts a folder with a pickle file per song into a corpus, songs are added in sorted order
+    with CorpusWriter(corpus_folder, dtype, row_shape) as corpus_writer:
+        for song_file in sorted(pickle_folder.rglob('*.pickle')):
+            song = pickle.load(open(song_file, 'rb'))
+            corpus_writer.add(song_file.name.replace('.pickle', ''), to_array(song))
@@ -1,3 +1,4 @@
+import functools
 from pathlib import Path
 
 import settings
@@ -6,6 +7,15 @@ import _pickle as pickle
 import pretty_midi as pm
 import mido
 
+from utils import note_events
+
+# chords and keys are sets of pitch classes, stored as bitmasks where bit i is set if pitch class i is played,
+# so every chord or scale is an integer below 2 ** PITCH_CLASSES and can index a lookup table
+PITCH_CLASSES = 12
+# control change number of the sustain pedal and the value from which on it is pressed, as in pretty_midi
+SUSTAIN_PEDAL = 64
+SUSTAIN_PEDAL_THRESHOLD = 64
+
 
 def change_tempo_of_midi_file(midi_file: Path, target_path: Path) -> None:
     midi = mido.MidiFile(midi_file)
@@ -23,37 +33,107 @@ def change_tempo_of_midi_file(midi_file: Path, target_path: Path) -> None:
 
 
 def pianoroll_to_histogram_per_bar(pianoroll: np.ndarray, samples_per_bar: int) -> np.ndarray:
-    histogram_per_bar = np.zeros((pianoroll.shape[0], int(pianoroll.shape[1] / samples_per_bar)))
-    for i in range(0, pianoroll.shape[1] - samples_per_bar + 1, samples_per_bar):
-        histogram_per_bar[:, int(i / samples_per_bar)] = np.sum(pianoroll[:, i:i + samples_per_bar], axis=1)
-    return histogram_per_bar
+    # works on a single (notes, time) bool pianoroll or a batch (..., notes, time), an incomplete last bar is dropped,
+    # the bars are a strided view of the pianoroll and are counted as uint16
+    num_bars = pianoroll.shape[-1] // samples_per_bar
+    bars = pianoroll[..., :num_bars * samples_per_bar].reshape(pianoroll.shape[:-1] + (num_bars, samples_per_bar))
+    return bars.sum(axis=-1, dtype=np.uint16)
 
 
 def shift_midi(semitones_to_shift: int, song_name: str, source_path: Path, target_path: Path) -> None:
     midi = pm.PrettyMIDI(str(source_path.joinpath(song_name)))
-    for instrument in midi.instruments:
-        if not instrument.is_drum:
-            for note in instrument.notes:
-                note.pitch -= semitones_to_shift
+    transpose_pretty_midi(midi, semitones_to_shift)
     midi.write(str(target_path.joinpath(song_name)))
 
 
-def chords_to_index(chords: list, chord_to_index: dict) -> list:
-    chords_index = []
-    for chord in chords:
-        if chord in chord_to_index:
-            chords_index.append(chord_to_index[chord])
-        else:
-            chords_index.append(chord_to_index[settings.unknown_chord_tag])
-    return chords_index
+def transpose_pretty_midi(midi: pm.PrettyMIDI, semitones_to_shift: int) -> None:
+    # a song with a note that is shifted out of the midi range can not be written as midi file, it is rejected here
+    # already, so the fused preprocessing drops the same songs as the staged one
+    notes = [note for instrument in midi.instruments if not instrument.is_drum for note in instrument.notes]
+    for note in notes:
+        if not 0 <= note.pitch - semitones_to_shift < 128:
+            raise ValueError(f'Pitch {note.pitch} shifted by {-semitones_to_shift} semitones is out of the midi range')
+    for note in notes:
+        note.pitch -= semitones_to_shift
 
 
-def chords_to_index_save(chords_file: Path, chords_index_folder: Path, chord_to_index: dict) -> None:
-    chords = pickle.load(open(chords_file, 'rb'))
-    chords_index = chords_to_index(chords, chord_to_index)
+def get_chord_index_table(chord_to_index: dict) -> np.ndarray:
+    # maps every chord bitmask to its index, chords that are not in the dictionary to the unknown chord tag
+    table = np.full(1 << PITCH_CLASSES, chord_to_index[settings.unknown_chord_tag], dtype=np.int64)
+    for chord, index in chord_to_index.items():
+        if chord != settings.unknown_chord_tag:
+            table[chord_to_bitmask(chord)] = index
+    return table
+
+
+def chords_to_index_save(chords_file: Path, chords_index_folder: Path, chord_index_table: np.ndarray) -> None:
+    chord_bitmasks = pickle.load(open(chords_file, 'rb'))
+    chords_index = chord_index_table[chord_bitmasks]
     pickle.dump(chords_index, open(chords_index_folder.joinpath(chords_file.name), 'wb'))
 
 
+def chord_to_bitmask(chord: tuple) -> int:
+    bitmask = 0
+    for note in chord:
+        bitmask |= 1 << int(note)
+    return bitmask
+
+
+def bitmask_to_chord(bitmask: int) -> tuple:
+    # the pitch classes in ascending order
+    return tuple(note for note in range(PITCH_CLASSES) if bitmask >> note & 1)
+
+
+def count_song_chords(chord_bitmasks: np.ndarray) -> list[tuple[int, int]]:
+    # (chord bitmask, count) of every chord of a song in the order of its first occurrence
+    bitmasks, first_indices, counts = np.unique(chord_bitmasks, return_index=True, return_counts=True)
+    order = np.argsort(first_indices)
+    return list(zip(bitmasks[order].tolist(), counts[order].tolist()))
+
+
+def key_to_shift(key: tuple):
+    shift = int(get_key_shift_table()[chord_to_bitmask(key)])
+    if shift < 0:
+        return 'other'
+    return shift
+
+
+@functools.lru_cache(maxsize=None)
+def get_key_shift_table() -> np.ndarray:
+    # maps every key bitmask to the semitones its diatonic scale is shifted from C major, -1 for other keys,
+    # the harmonic, melodic and blues scales are not shifted
+    diatonic_scales, harmonic_scales, melodic_scales, blues_scales = get_scales()
+    table = np.full(1 << PITCH_CLASSES, -1, dtype=np.int8)
+    for shift, scale in reversed(list(enumerate(diatonic_scales))):
+        table[chord_to_bitmask(scale)] = shift
+    table.flags.writeable = False
+    return table
+
+
+def get_scales() -> tuple:
+    # get all scales for every root note
+    diatonic_scale = tuple((0, 2, 4, 5, 7, 9, 11))
+    diatonic_scales = []
+    for i in range(0, 12):
+        diatonic_scales.append(tuple(np.sort((np.array(diatonic_scale) + i) % 12)))
+
+    harmonic_scale = tuple((0, 2, 4, 5, 8, 9, 11))
+    harmonic_scales = []
+    for i in range(0, 12):
+        harmonic_scales.append(tuple(np.sort((np.array(harmonic_scale) + i) % 12)))
+
+    melodic_scale = tuple((0, 2, 4, 6, 8, 9, 11))
+    melodic_scales = []
+    for i in range(0, 12):
+        melodic_scales.append(tuple(np.sort((np.array(melodic_scale) + i) % 12)))
+    blues_scale = tuple((0, 3, 5, 6, 7, 10))
+    blues_scales = []
+    for i in range(0, 12):
+        blues_scales.append(tuple(np.sort((np.array(blues_scale) + i) % 12)))
+
+    return diatonic_scales, harmonic_scales, melodic_scales, blues_scales
+
+
 def song_histogram_to_key(song_histogram: np.ndarray, key_n: int) -> tuple:
     most_played_notes_per_song = song_histogram.argsort(axis=0)[-key_n:]
     most_played_notes_per_song.sort()
@@ -61,27 +141,22 @@ def song_histogram_to_key(song_histogram: np.ndarray, key_n: int) -> tuple:
 
 
 def bar_histogram_to_chords(histogram_per_bar: np.ndarray, notes_per_chord: int) -> list:
+    return [bitmask_to_chord(bitmask) for bitmask in bar_histogram_to_chord_bitmasks(
+        histogram_per_bar, notes_per_chord).tolist()]
+
+
+def bar_histogram_to_chord_bitmasks(histogram_per_bar: np.ndarray, notes_per_chord: int) -> np.ndarray:
+    # the chord of every bar are its notes_per_chord most played pitch classes, pitch classes that are not played
+    # are left out
     most_played_notes_per_bar = histogram_per_bar.argsort(axis=0)[-notes_per_chord:]
-    chords = []
-    for i in range(0, most_played_notes_per_bar.shape[1]):
-        chord = []
-        for note in most_played_notes_per_bar[:, i]:
-            if histogram_per_bar[note, i] != 0:
-                chord.append(note)
-        chord.sort()
-        chords.append(tuple(chord))
-    return chords
-
-
-def pianoroll_to_note_index(pianoroll: np.ndarray) -> list[tuple]:
-    note_index = []
-    for i in range(0, pianoroll.shape[1]):
-        step = []
-        for j, note in enumerate(pianoroll[:, i]):
-            if note != 0:
-                step.append(j)
-        note_index.append(tuple(step))
-    return note_index
+    is_played = np.take_along_axis(histogram_per_bar, most_played_notes_per_bar, axis=0) != 0
+    note_bits = np.where(is_played, np.left_shift(1, most_played_notes_per_bar), 0)
+    return np.bitwise_or.reduce(note_bits, axis=0).astype(np.uint16)
+
+
+def pianoroll_to_packed_notes(pianoroll: np.ndarray) -> np.ndarray:
+    # a row of 128 bits per time step, bit i of a row is set if midi note i is played, see utils.corpus
+    return np.packbits(pianoroll.T.astype(bool, copy=False), axis=1)
 
 
 def load_histo_save_song_histo(histogram_per_bar_file: Path, song_histogram_path: Path) -> None:
@@ -90,64 +165,216 @@ def load_histo_save_song_histo(histogram_per_bar_file: Path, song_histogram_path
     pickle.dump(histogram_of_song, open(song_histogram_path.joinpath(histogram_per_bar_file.name), 'wb'))
 
 
-def chord_histogram_to_chords(notes_per_chord: int, chord_histogram_path: Path, chords_path: Path) -> None:
+def chord_histogram_to_chords(notes_per_chord: int, chord_histogram_path: Path, chords_path: Path) -> list:
+    # returns the chord counts of the song for the chord vocabulary
     chord_histogram = pickle.load(open(chord_histogram_path, 'rb'))
-    chords = bar_histogram_to_chords(chord_histogram, notes_per_chord)
-    pickle.dump(chords, open(chords_path.joinpath(chord_histogram_path.name), 'wb'))
+    chord_bitmasks = bar_histogram_to_chord_bitmasks(chord_histogram, notes_per_chord)
+    pickle.dump(chord_bitmasks, open(chords_path.joinpath(chord_histogram_path.name), 'wb'))
+    return count_song_chords(chord_bitmasks)
 
 
 def squash_octaves(histogram_per_bar: np.ndarray, semitones_in_octave: int) -> np.ndarray:
-    squashed_histogram = np.zeros((semitones_in_octave, histogram_per_bar.shape[1]))
-    for i in range(0, histogram_per_bar.shape[0] - semitones_in_octave + 1, semitones_in_octave):
-        squashed_histogram = np.add(squashed_histogram, histogram_per_bar[i:i + semitones_in_octave])
-    return squashed_histogram
+    # works on a single (notes, bars) histogram or a batch (..., notes, bars), an incomplete last octave is dropped,
+    # the octaves are summed in the dtype of the histogram
+    num_octaves = histogram_per_bar.shape[-2] // semitones_in_octave
+    octaves = histogram_per_bar[..., :num_octaves * semitones_in_octave, :].reshape(
+        histogram_per_bar.shape[:-2] + (num_octaves, semitones_in_octave, histogram_per_bar.shape[-1]))
+    return octaves.sum(axis=-3, dtype=histogram_per_bar.dtype)
 
 
 def midi_to_histo_oct(samples_per_bar: int, semitones_in_octave: int, fs: int, midi_file: Path, histogram_path: Path) -> None:
     pianoroll = get_pianoroll(midi_file, fs)
+    histogram_per_bar_squashed_octaves = pianoroll_to_histo_oct(pianoroll, samples_per_bar, semitones_in_octave)
+    pickle.dump(histogram_per_bar_squashed_octaves, open(histogram_path.joinpath(midi_file.name + '.pickle'), 'wb'))
+
+
+def note_events_to_histo_oct(samples_per_bar: int, semitones_in_octave: int, fs: int, note_events_file: Path,
+                             histogram_path: Path) -> None:
+    midi = note_events.note_events_to_pretty_midi(note_events.load_note_events(note_events_file))
+    histogram_per_bar_squashed_octaves = pretty_midi_to_histogram_per_bar(
+        midi, samples_per_bar, semitones_in_octave, fs)
+    song_name = note_events.get_song_name(note_events_file)
+    pickle.dump(histogram_per_bar_squashed_octaves, open(histogram_path.joinpath(song_name + '.pickle'), 'wb'))
+
+
+def pretty_midi_to_histogram_per_bar(midi: pm.PrettyMIDI, samples_per_bar: int, semitones_in_octave: int,
+                                     fs: int) -> np.ndarray:
+    if settings.event_based_histograms:
+        return pretty_midi_to_histo_oct(midi, samples_per_bar, semitones_in_octave, fs)
+    return pianoroll_to_histo_oct(get_pianoroll_of_pretty_midi(midi, fs), samples_per_bar, semitones_in_octave)
+
+
+def pianoroll_to_histo_oct(pianoroll: np.ndarray, samples_per_bar: int, semitones_in_octave: int) -> np.ndarray:
+    # counted as uint16, returned as float64 like the event based histograms
     histogram_per_bar = pianoroll_to_histogram_per_bar(pianoroll, samples_per_bar)
-    histogram_per_bar_squashed_octaves = squash_octaves(histogram_per_bar, semitones_in_octave)
+    return squash_octaves(histogram_per_bar, semitones_in_octave).astype(np.float64)
+
+
+def midi_to_histo_oct_event_based(samples_per_bar: int, semitones_in_octave: int, fs: int, midi_file: Path,
+                                  histogram_path: Path) -> None:
+    midi = pm.PrettyMIDI(str(midi_file))
+    histogram_per_bar_squashed_octaves = pretty_midi_to_histo_oct(midi, samples_per_bar, semitones_in_octave, fs)
     pickle.dump(histogram_per_bar_squashed_octaves, open(histogram_path.joinpath(midi_file.name + '.pickle'), 'wb'))
 
 
+def pretty_midi_to_histo_oct(midi: pm.PrettyMIDI, samples_per_bar: int, semitones_in_octave: int,
+                             fs: int) -> np.ndarray:
+    # Event based counterpart of get_pianoroll + pianoroll_to_histo_oct, the time steps a note covers are derived
+    # from its onset and offset, so memory scales with the number of notes instead of the song duration.
+    # The result is identical for songs without sustain pedals and pitch bends, which the sampled pianoroll renders
+    # as longer or moved notes and which are ignored here, so with sustain pedals the counts can only be lower.
+    factor = settings.over_sample_factor if settings.over_sample_midi_files else 1
+    fine_fs = fs * factor
+    instruments = [instrument for instrument in midi.instruments if instrument.notes]
+    fine_length = max([int(fine_fs * instrument.get_end_time()) for instrument in instruments], default=0)
+    num_bars = -(-fine_length // factor) // samples_per_bar
+    notes = [note for instrument in instruments if not instrument.is_drum for note in instrument.notes]
+    pitches = np.array([note.pitch for note in notes], dtype=np.int64)
+    velocities = np.array([note.velocity for note in notes], dtype=np.int64)
+    fine_starts = (np.array([note.start for note in notes], dtype=np.float64) * fine_fs).astype(np.int64)
+    fine_ends = (np.array([note.end for note in notes], dtype=np.float64) * fine_fs).astype(np.int64)
+
+    # a time step is played if any of the over sampled steps it sums is played
+    is_played = (fine_starts < fine_ends) & (velocities != 0) & (pitches >= 0) & (pitches < 128)
+    pitches = pitches[is_played]
+    starts = np.minimum(fine_starts[is_played] // factor, num_bars * samples_per_bar)
+    ends = np.minimum(-(-fine_ends[is_played] // factor), num_bars * samples_per_bar)
+    pitches, starts, ends = _merge_intervals_per_pitch(pitches, starts, ends, num_bars * samples_per_bar)
+    num_octaves = 128 // semitones_in_octave
+    is_counted = (starts < ends) & (pitches < num_octaves * semitones_in_octave)
+    pitch_classes, starts, ends = pitches[is_counted] % semitones_in_octave, starts[is_counted], ends[is_counted]
+
+    # steps in the first and last bar of an interval are added directly, full bars in between via a difference array
+    histogram = np.zeros((semitones_in_octave, num_bars + 1), dtype=np.float64)
+    first_bars, last_bars = starts // samples_per_bar, (ends - 1) // samples_per_bar
+    single_bar = first_bars == last_bars
+    np.add.at(histogram, (pitch_classes, first_bars),
+              np.where(single_bar, ends - starts, (first_bars + 1) * samples_per_bar - starts))
+    np.add.at(histogram, (pitch_classes[~single_bar], last_bars[~single_bar]),
+              ends[~single_bar] - last_bars[~single_bar] * samples_per_bar)
+    full_bars = np.zeros((semitones_in_octave, num_bars + 1), dtype=np.float64)
+    has_full_bars = last_bars - first_bars > 1
+    np.add.at(full_bars, (pitch_classes[has_full_bars], first_bars[has_full_bars] + 1), samples_per_bar)
+    np.add.at(full_bars, (pitch_classes[has_full_bars], last_bars[has_full_bars]), -samples_per_bar)
+    histogram += np.cumsum(full_bars, axis=1)
+    return histogram[:, :num_bars]
+
+
+def _merge_intervals_per_pitch(pitches: np.ndarray, starts: np.ndarray, ends: np.ndarray,
+                                length: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # overlapping notes of the same pitch only count once, offsetting every pitch by the song length
+    # lets a single running maximum merge the intervals of all pitches
+    offsets = pitches * (length + 1)
+    order = np.lexsort((starts, pitches))
+    starts, ends = starts[order] + offsets[order], ends[order] + offsets[order]
+    running_ends = np.maximum.accumulate(ends)
+    is_new = np.ones(len(starts), dtype=bool)
+    is_new[1:] = starts[1:] > running_ends[:-1]
+    merged_starts = starts[is_new]
+    merged_ends = running_ends[np.append(np.flatnonzero(is_new)[1:] - 1, len(starts) - 1)] if len(starts) else ends
+    merged_pitches = merged_starts // (length + 1)
+    return merged_pitches, merged_starts - merged_pitches * (length + 1), merged_ends - merged_pitches * (length + 1)
+
+
 def over_sample(midi_file: pm.PrettyMIDI) -> np.ndarray:
-    pianoroll_double_sampled = midi_file.get_piano_roll(fs=settings.sampling_frequency * settings.over_sample_factor)
-    pianoroll = []
-    for i in range(0, pianoroll_double_sampled.shape[1], settings.over_sample_factor):
-        vec = np.sum(pianoroll_double_sampled[:, i:(i + settings.over_sample_factor)], axis=1)
-        pianoroll.append(vec)
-    pianoroll = np.array(pianoroll)
-    pianoroll = np.transpose(pianoroll)
+    pianoroll_over_sampled = get_played_notes(midi_file, settings.sampling_frequency * settings.over_sample_factor)
+    return down_sample(pianoroll_over_sampled, settings.over_sample_factor)
+
+
+def down_sample(pianoroll: np.ndarray, factor: int) -> np.ndarray:
+    # a step of a bool pianoroll is played if any of its factor consecutive steps is, the last step combines the
+    # remaining ones
+    if pianoroll.shape[-1] == 0:
+        return pianoroll
+    return np.logical_or.reduceat(pianoroll, np.arange(0, pianoroll.shape[-1], factor), axis=-1)
+
+
+def get_played_notes(midi: pm.PrettyMIDI, fs: int) -> np.ndarray:
+    # (128, steps) bool pianoroll that is True where the pretty_midi get_piano_roll of the midi is not 0.
+    # pretty_midi sums a float64 roll per instrument, here all instruments are written into one bool roll, only
+    # instruments with sustain pedals or pitch bends need a roll of their own while they are processed.
+    end_times = [instrument.get_end_time() for instrument in midi.instruments]
+    pianoroll = np.zeros((128, max([int(fs * end_time) for instrument, end_time in zip(midi.instruments, end_times)
+                                    if instrument.notes], default=0)), dtype=bool)
+    for instrument, end_time in zip(midi.instruments, end_times):
+        # drums are not pitched, pretty_midi only uses them for the length of the pianoroll
+        if instrument.is_drum or not instrument.notes:
+            continue
+        is_sustained = any(control_change.number == SUSTAIN_PEDAL for control_change in instrument.control_changes)
+        is_bent = any(abs(pitch_bend.pitch) >= 1 for pitch_bend in instrument.pitch_bends)
+        if not is_sustained and not is_bent:
+            _add_notes(pianoroll, instrument.notes, fs)
+            continue
+        instrument_pianoroll = np.zeros((128, int(fs * end_time)), dtype=bool)
+        _add_notes(instrument_pianoroll, instrument.notes, fs)
+        _sustain_notes(instrument_pianoroll, instrument.control_changes, fs)
+        _bend_notes(instrument_pianoroll, instrument.pitch_bends, fs, end_time)
+        pianoroll[:, :instrument_pianoroll.shape[1]] |= instrument_pianoroll
     return pianoroll
 
 
+def _add_notes(pianoroll: np.ndarray, notes: list, fs: int) -> None:
+    for note in notes:
+        # a negative pitch would silently index the pianoroll from its end
+        if not 0 <= note.pitch < 128:
+            raise ValueError(f'Pitch {note.pitch} is out of the midi range')
+        if note.velocity != 0:
+            pianoroll[note.pitch, int(note.start * fs):int(note.end * fs)] = True
+
+
+def _sustain_notes(pianoroll: np.ndarray, control_changes: list, fs: int) -> None:
+    # a note that is played while the sustain pedal is pressed is held until the pedal is released
+    pedal_step = None
+    for control_change in control_changes:
+        if control_change.number != SUSTAIN_PEDAL:
+            continue
+        step = int(control_change.time * fs)
+        if control_change.value >= SUSTAIN_PEDAL_THRESHOLD:
+            if pedal_step is None:
+                pedal_step = step
+        elif pedal_step is not None:
+            pedaled_steps = pianoroll[:, pedal_step:step]
+            np.logical_or.accumulate(pedaled_steps, axis=1, out=pedaled_steps)
+            pedal_step = None
+
+
+def _bend_notes(pianoroll: np.ndarray, pitch_bends: list, fs: int, end_time: float) -> None:
+    # the notes in the steps of a bend are shifted by its whole semitones, pretty_midi interpolates a fraction of
+    # a semitone between two pitches, which plays both of them
+    pitch_bends = sorted(pitch_bends, key=lambda pitch_bend: pitch_bend.time)
+    bend_end_times = [pitch_bend.time for pitch_bend in pitch_bends[1:]] + [end_time]
+    for pitch_bend, bend_end_time in zip(pitch_bends, bend_end_times):
+        if abs(pitch_bend.pitch) < 1:
+            continue
+        semitones = pm.pitch_bend_to_semitones(pitch_bend.pitch)
+        whole_semitones = int(np.sign(semitones) * np.floor(np.abs(semitones)))
+        bent_steps = pianoroll[:, int(pitch_bend.time * fs):int(bend_end_time * fs)]
+        steps = bent_steps.copy()
+        bent_steps[:] = False
+        if whole_semitones >= 0:
+            bent_steps[whole_semitones:] = steps[:128 - whole_semitones]
+        else:
+            bent_steps[:whole_semitones] = steps[-whole_semitones:]
+        if semitones != whole_semitones:
+            if pitch_bend.pitch >= 0:
+                bent_steps[1:] |= bent_steps[:-1].copy()
+            else:
+                bent_steps[:-1] |= bent_steps[1:].copy()
+
+
 def save_note_ind(midi_file: Path, target_path: Path, fs: int) -> None:
-    midi = pm.PrettyMIDI(str(midi_file))
-    if settings.over_sample_midi_files:
-        pianoroll = over_sample(midi)
-    else:
-        pianoroll = midi.get_piano_roll(fs=fs)
-    for i, _ in enumerate(pianoroll):
-        for j, _ in enumerate(pianoroll[i]):
-            if pianoroll[i, j] != 0:
-                pianoroll[i, j] = 1
-    note_index_pianoroll = pianoroll_to_note_index(pianoroll)
-    pickle.dump(note_index_pianoroll, open(target_path.joinpath(midi_file.name + '.pickle'), 'wb'))
+    pianoroll = get_pianoroll(midi_file, fs)
+    packed_notes = pianoroll_to_packed_notes(pianoroll)
+    pickle.dump(packed_notes, open(target_path.joinpath(midi_file.name + '.pickle'), 'wb'))
 
 
 def get_pianoroll(midi_file: Path, fs: int) -> np.ndarray:
-    pianoroll = get_notes(midi_file, fs)
-    for i, _ in enumerate(pianoroll):
-        for j, _ in enumerate(pianoroll[i]):
-            if pianoroll[i, j] != 0:
-                pianoroll[i, j] = 1
-    return pianoroll
+    return get_pianoroll_of_pretty_midi(pm.PrettyMIDI(str(midi_file)), fs)
 
 
-def get_notes(midi_file: Path, fs: int) -> np.ndarray:
-    midi = pm.PrettyMIDI(str(midi_file))
+def get_pianoroll_of_pretty_midi(midi: pm.PrettyMIDI, fs: int) -> np.ndarray:
     if settings.over_sample_midi_files:
         pianoroll = over_sample(midi)
     else:
-        pianoroll = midi.get_piano_roll(fs=fs)
+        pianoroll = get_played_notes(midi, fs)
     return pianoroll
@@ -0,0 +1,109 @@
+from pathlib import Path
+
+import numpy as np
+import pretty_midi as pm
+
+# The note events of a song are everything of its parsed midi file the preprocessing reads, stored as numpy arrays
+# in a single compressed .npz file, so the midi file is parsed once and the stages read the events without parsing.
+# The events of all instruments are stored in flat arrays with the index of their instrument, every event time
+# in seconds of the original tempo and in ticks, from which the events are timed at any other constant tempo.
+NOTE_EVENTS_SUFFIX = '.npz'
+
+# name of the events: pretty_midi class, attribute of the instrument or song holding them, stored attributes in the
+# order of the constructor with their dtype, and the time attributes that follow them in the constructor
+INSTRUMENT_EVENTS = {
+    'note': (pm.Note, 'notes', {'velocity': np.uint8, 'pitch': np.uint8}, ('start', 'end')),
+    'control_change': (pm.ControlChange, 'control_changes', {'number': np.uint8, 'value': np.uint8}, ('time',)),
+    'pitch_bend': (pm.PitchBend, 'pitch_bends', {'pitch': np.int16}, ('time',)),
+}
+SONG_EVENTS = {
+    'time_signature': (pm.TimeSignature, 'time_signature_changes', {'numerator': np.int32, 'denominator': np.int32},
+                       ('time',)),
+    'key_signature': (pm.KeySignature, 'key_signature_changes', {'key_number': np.uint8}, ('time',)),
+}
+
+
+def get_song_name(note_events_file: Path) -> str:
+    # name of the midi file the events were parsed from
+    return note_events_file.name[:-len(NOTE_EVENTS_SUFFIX)]
+
+
+def save_note_events(midi_file: Path, note_events_folder: Path) -> None:
+    note_events = pretty_midi_to_note_events(pm.PrettyMIDI(str(midi_file)))
+    np.savez_compressed(note_events_folder.joinpath(midi_file.name + NOTE_EVENTS_SUFFIX), **note_events)
+
+
+def load_note_events(note_events_file: Path) -> dict[str, np.ndarray]:
+    with np.load(note_events_file, allow_pickle=False) as note_events:
+        return dict(note_events)
+
+
+def pretty_midi_to_note_events(midi: pm.PrettyMIDI) -> dict[str, np.ndarray]:
+    tempo_change_times, tempi = midi.get_tempo_changes()
+    note_events = {
+        'resolution': np.array(midi.resolution, dtype=np.int64),
+        'tempo_change_times': tempo_change_times,
+        'tempi': tempi,
+        'instrument_programs': np.array([instrument.program for instrument in midi.instruments], dtype=np.uint8),
+        'instrument_is_drum': np.array([instrument.is_drum for instrument in midi.instruments], dtype=bool),
+        'instrument_names': np.array([instrument.name for instrument in midi.instruments], dtype=str),
+    }
+    for name, (_, events_attribute, attributes, time_attributes) in INSTRUMENT_EVENTS.items():
+        events = [(instrument_index, event) for instrument_index, instrument in enumerate(midi.instruments)
+                  for event in getattr(instrument, events_attribute)]
+        note_events[name + '_instruments'] = np.array([index for index, _ in events], dtype=np.uint16)
+        note_events.update(_get_event_arrays(midi, name, [event for _, event in events], attributes, time_attributes))
+    for name, (_, events_attribute, attributes, time_attributes) in SONG_EVENTS.items():
+        note_events.update(_get_event_arrays(midi, name, getattr(midi, events_attribute), attributes, time_attributes))
+    return note_events
+
+
+def note_events_to_pretty_midi(note_events: dict[str, np.ndarray]) -> pm.PrettyMIDI:
+    # the events timed like in the parsed midi file, the tempo changes are not restored, so the midi is meant to be
+    # read and not to be written
+    midi = pm.PrettyMIDI(resolution=int(note_events['resolution']))
+    return _add_events(midi, note_events, lambda name, time_attribute: note_events[f'{name}_{time_attribute}'])
+
+
+def note_events_to_tempo_shifted_pretty_midi(note_events: dict[str, np.ndarray], bpm: float) -> pm.PrettyMIDI:
+    # all events keep their tick but are timed at a constant tempo of bpm
+    resolution = int(note_events['resolution'])
+    seconds_per_tick = 60.0 / (float(bpm) * resolution)
+    midi = pm.PrettyMIDI(resolution=resolution, initial_tempo=float(bpm))
+    return _add_events(midi, note_events,
+                       lambda name, time_attribute: note_events[f'{name}_{time_attribute}_tick'] * seconds_per_tick)
+
+
+def _get_event_arrays(midi: pm.PrettyMIDI, name: str, events: list, attributes: dict,
+                      time_attributes: tuple) -> dict[str, np.ndarray]:
+    event_arrays = dict()
+    for attribute, dtype in attributes.items():
+        event_arrays[f'{name}_{attribute}'] = np.array([getattr(event, attribute) for event in events], dtype=dtype)
+    for time_attribute in time_attributes:
+        times = [getattr(event, time_attribute) for event in events]
+        event_arrays[f'{name}_{time_attribute}'] = np.array(times, dtype=np.float64)
+        event_arrays[f'{name}_{time_attribute}_tick'] = np.array([midi.time_to_tick(time) for time in times],
+                                                                 dtype=np.int64)
+    return event_arrays
+
+
+def _get_event_columns(note_events: dict[str, np.ndarray], name: str, attributes: dict, time_attributes: tuple,
+                       get_times) -> list[list]:
+    # the constructor arguments of the events as python lists, so the events hold python numbers like parsed ones
+    return [note_events[f'{name}_{attribute}'].tolist() for attribute in attributes] +\
+        [np.asarray(get_times(name, time_attribute), dtype=np.float64).tolist() for time_attribute in time_attributes]
+
+
+def _add_events(midi: pm.PrettyMIDI, note_events: dict[str, np.ndarray], get_times) -> pm.PrettyMIDI:
+    for program, is_drum, instrument_name in zip(note_events['instrument_programs'].tolist(),
+                                                 note_events['instrument_is_drum'].tolist(),
+                                                 note_events['instrument_names'].tolist()):
+        midi.instruments.append(pm.Instrument(program, is_drum, instrument_name))
+    for name, (event_class, events_attribute, attributes, time_attributes) in INSTRUMENT_EVENTS.items():
+        columns = _get_event_columns(note_events, name, attributes, time_attributes, get_times)
+        for instrument_index, *values in zip(note_events[name + '_instruments'].tolist(), *columns):
+            getattr(midi.instruments[instrument_index], events_attribute).append(event_class(*values))
+    for name, (event_class, events_attribute, attributes, time_attributes) in SONG_EVENTS.items():
+        columns = _get_event_columns(note_events, name, attributes, time_attributes, get_times)
+        setattr(midi, events_attribute, [event_class(*values) for values in zip(*columns)])
+    return midi